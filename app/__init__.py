@@ -6,6 +6,7 @@ from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
 from healthcheck import HealthCheck
+from werkzeug.middleware.proxy_fix import ProxyFix
 # from healthcheck import EnvironmentDump
 
 from app.versioning import versioned
@@ -22,6 +23,9 @@ app = Flask(__name__, static_folder='app/static')
 app.config.from_object(Config)
 app.url_map.strict_slashes = False
 
+if Config.PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.PROXY_COUNT)
+
 db.init_app(app)
 migrate.init_app(app, db)
 
@@ -1,21 +1,30 @@
 import uuid
 import os
+import random
+import time
 from enum import Enum
 import functools
+from hashlib import sha256
 
-import requests
 from app import db
+from app.api.oc_api import oc_api
+from app.audit import setup_audit_logger
+from app.cache import auth_cache, jwt_cache
 from app.models import Key
 from app.utils import setup_logger, standardize_response
-from flask import g, request
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from flask import current_app, g, request
+from sqlalchemy.orm import make_transient_to_detached
 
 from jwt import decode, InvalidSignatureError, ExpiredSignatureError
 
 PUBLIC_KEY = os.environ.get('JWT_PUBLIC_KEY', open(".dev/dev-jwt-key.pub").read())
+# Parsed once instead of for every token
+PUBLIC_KEY_OBJECT = load_pem_public_key(PUBLIC_KEY.encode())
 
 auth_logger = setup_logger('auth_logger')
-create_logger = setup_logger('create_auth_logger')
-update_logger = setup_logger('update_auth_logger')
+create_logger = setup_audit_logger('create_auth_logger')
+update_logger = setup_audit_logger('update_auth_logger')
 
 
 class ApiKeyError(Exception):
@@ -31,6 +40,45 @@ class ApiKeyErrorCode(Enum):
     NOT_DENIED = 3
 
 
+def cached_key(cache_key, query):
+    """
+    Key matching `query`, read from the auth cache when possible. Keys read
+    from the cache are detached from the session, they need to be merged into
+    it to be changed.
+    """
+    generation = auth_cache.generation()
+    fields = auth_cache.get(cache_key, generation=generation)
+    if fields is not None:
+        id, apikey, email, denied = fields
+        key = Key(id=id, apikey=apikey, email=email, denied=denied)
+        make_transient_to_detached(key)
+        return key
+
+    key = query.first()
+    if key:
+        fields = (key.id, key.apikey, key.email, key.denied)
+        auth_cache.set(('apikey', key.apikey), fields, generation=generation)
+        auth_cache.set(('email', key.email), fields, generation=generation)
+    return key
+
+
+def find_key_by_apikey(apikey):
+    return cached_key(('apikey', apikey), Key.query.filter_by(apikey=apikey))
+
+
+def find_key_by_email(email):
+    return cached_key(('email', email), Key.query.filter_by(email=email))
+
+
+def forget_keys():
+    """Drops the cached keys of every process of the host, call after changing one"""
+    # Clearing rather than deleting the key also keeps lookups that read it
+    # before the change from caching it again, see Cache.set
+    auth_cache.clear()
+    # The CLI denies and rotates keys from outside of the workers' cache
+    auth_cache.clear_workers()
+
+
 def find_key_by_apikey_or_email(apikey_or_email):
     key = Key.query.filter_by(apikey=apikey_or_email).first()
     if key:
@@ -54,6 +102,7 @@ def deny_key(apikey_or_email, denied, session):
     key.denied = denied
 
     session.commit()
+    forget_keys()
 
     return key
 
@@ -75,6 +124,7 @@ def create_new_apikey(email, session):
     try:
         session.add(new_key)
         session.commit()
+        forget_keys()
 
         return new_key
     except Exception as e:
@@ -83,9 +133,11 @@ def create_new_apikey(email, session):
 
 
 def rotate_key(key, session):
+    key = session.merge(key)
     key.apikey = get_new_key_value()
     try:
         session.commit()
+        forget_keys()
         return key
     except Exception as e:
         auth_logger.exception(e)
@@ -101,9 +153,7 @@ def jwt_to_key():
         return None
     _, token = auth_parts
     try:
-        decoded_token = decode(
-            token, PUBLIC_KEY, algorithms="RS256"
-        )
+        decoded_token = decode_token(token)
         request.decoded_token = decoded_token
     except InvalidSignatureError:
         return None
@@ -114,9 +164,27 @@ def jwt_to_key():
     return get_api_key_from_authenticated_email(decoded_token['email'])
 
 
+def decode_token(token):
+    """
+    Verifies the token and returns its claims. The claims of tokens that
+    expire are cached until they do, so a token is only verified once.
+    """
+    digest = sha256(token.encode()).digest()
+    decoded_token = jwt_cache.get(digest)
+    if decoded_token is not None:
+        if decoded_token['exp'] > time.time():
+            return decoded_token
+        jwt_cache.delete(digest)
+
+    decoded_token = decode(token, PUBLIC_KEY_OBJECT, algorithms="RS256")
+    if 'exp' in decoded_token:
+        jwt_cache.set(digest, decoded_token, ttl=decoded_token['exp'] - time.time())
+    return decoded_token
+
+
 # NOTE: this function assumes the email has already been authenticated
 def get_api_key_from_authenticated_email(email):
-    apikey = Key.query.filter_by(email=email).first()
+    apikey = find_key_by_email(email)
 
     if apikey and apikey.denied:
         return None
@@ -136,11 +204,13 @@ def authenticate(func=None, allow_no_auth_key=False):
     def wrapper(*args, **kwargs):
         apikey = request.headers.get('x-apikey')
         try:
-            filters = {'apikey': apikey, 'denied': False}
-            key = Key.query.filter_by(**filters).first() if apikey else jwt_to_key()
+            key = find_key_by_apikey(apikey) if apikey else jwt_to_key()
         except Exception:
             return standardize_response(status_code=500)
 
+        if key and key.denied:
+            key = None
+
         if not key and not allow_no_auth_key:
             return standardize_response(status_code=401)
 
@@ -154,21 +224,30 @@ def authenticate(func=None, allow_no_auth_key=False):
 
 
 def is_user_oc_member(email, password):
-    response = requests.post(
-        'https://api.operationcode.org/auth/login/',
-        json=dict(
-            email=email,
-            password=password
-        )
-    )
-
-    return bool(response.json().get('token'))
+    """Raises OCApiError when the Operation Code API can't tell"""
+    return bool(oc_api.login(email, password).get('token'))
 
 
 def log_request(request, key):
+    """
+    Logs who called which route. The record is formatted and written by the
+    audit log thread, with the raw body of a sample of the requests.
+    """
     method = request.method
-    path = request.path
-    user = key.email
-    payload = request.get_json(silent=True)
+    body = request.get_data(cache=True)
+    entry = {
+        'user': key.email,
+        'method': method,
+        'route': request.path,
+        'payload_size': len(body),
+    }
+
+    config = current_app.config
+    # Sampling only keeps the logs small, it doesn't need to be unpredictable
+    if random.random() < config['AUDIT_LOG_PAYLOAD_SAMPLE_RATE']:  # nosec B311
+        max_payload = config['AUDIT_LOG_MAX_PAYLOAD']
+        entry['payload'] = body[:max_payload] if body else None
+        entry['payload_truncated'] = len(body) > max_payload
+
     logger = create_logger if method == "POST" else update_logger
-    logger.info(f"User: {user} Route: {path} Payload: {payload}")
+    logger.info(entry)
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import requests
+from prometheus_client import Counter, Summary
+
+from configs import Config
+
+oc_api_latency = Summary(
+    'oc_api_request_latency_seconds', 'Length of requests to the Operation Code API')
+oc_api_errors = Counter(
+    'oc_api_errors', 'Failed requests to the Operation Code API', ['reason'])
+
+
+class OCApiError(Exception):
+    """The Operation Code API couldn't be reached or answered with an error"""
+
+
+class CircuitOpenError(OCApiError):
+    """The request wasn't sent because the API failed too many times in a row"""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service. After `failure_threshold` failures in a
+    row the circuit opens and `allow` rejects calls for `reset_timeout`
+    seconds. Then a single trial call is allowed: the circuit closes if it
+    succeeds, and stays open for another `reset_timeout` seconds if it fails.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._trial or self._reset_timeout_elapsed():
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or not self._reset_timeout_elapsed():
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def _reset_timeout_elapsed(self):
+        return time.monotonic() - self._opened_at >= self.reset_timeout
+
+
+class OCApiClient:
+    """
+    Client of the Operation Code login API. Requests go through one session,
+    which keeps connections to the API open between requests, are bounded by
+    connect and read timeouts, and fail fast while the circuit breaker is open.
+    """
+
+    def __init__(self, url, connect_timeout=3.05, read_timeout=10, breaker=None):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+
+    def login(self, email, password):
+        """Posts the credentials to the login endpoint, returns the JSON answer"""
+        if not self.breaker.allow():
+            oc_api_errors.labels(reason='circuit-open').inc()
+            raise CircuitOpenError("The Operation Code API is unavailable")
+
+        try:
+            with oc_api_latency.time():
+                response = self.session.post(
+                    self.url,
+                    json=dict(email=email, password=password),
+                    timeout=self.timeout)
+            if response.status_code >= 500:
+                raise OCApiError(
+                    f"The Operation Code API answered {response.status_code}")
+            body = response.json()
+        except Exception as e:
+            oc_api_errors.labels(reason=self._failure_reason(e)).inc()
+            self.breaker.record_failure()
+            if isinstance(e, OCApiError):
+                raise
+            raise OCApiError(f"The Operation Code API request failed: {e}") from e
+
+        self.breaker.record_success()
+        return body
+
+    @staticmethod
+    def _failure_reason(error):
+        if isinstance(error, requests.Timeout):
+            return 'timeout'
+        if isinstance(error, requests.ConnectionError):
+            return 'connection'
+        if isinstance(error, OCApiError):
+            return 'server-error'
+        return 'invalid-response'
+
+
+oc_api = OCApiClient(
+    Config.OC_API_URL,
+    connect_timeout=Config.OC_API_CONNECT_TIMEOUT,
+    read_timeout=Config.OC_API_READ_TIMEOUT,
+    breaker=CircuitBreaker(
+        failure_threshold=Config.OC_API_FAILURE_THRESHOLD,
+        reset_timeout=Config.OC_API_RESET_TIMEOUT))
@@ -0,0 +1,106 @@
+import functools
+import math
+import time
+from collections import namedtuple
+
+from flask import abort, after_this_request, current_app, g, request
+from prometheus_client import Counter
+
+from app.cache import LRUCache, SharedMemoryCache
+from configs import Config
+
+rate_limited_counter = Counter(
+    'rate_limited_requests', 'Requests rejected by the rate limiter', ['group'])
+
+RateLimit = namedtuple('RateLimit', ['limit', 'remaining', 'reset', 'retry_after'])
+
+
+class TokenBucketLimiter:
+    """
+    Rate limiter keeping a token bucket per key in a cache backend, so every
+    uWSGI worker sharing the backend enforces the same limits. A bucket holds
+    up to `capacity` tokens and refills at `capacity` tokens per `period`
+    seconds; every request takes a token and is rejected when there are none.
+
+    A bucket that was evicted from the cache starts full again, so the limits
+    are only as strict as the cache is large.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, key, capacity, period=60):
+        """Takes a token from the bucket of `key`, returns a RateLimit"""
+        rate = capacity / period
+
+        def take(bucket):
+            now = time.time()
+            tokens, updated_at, _ = bucket or (capacity, now, False)
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            return (tokens - 1 if allowed else tokens, now, allowed)
+
+        # Once full again, a bucket is the same as no bucket at all
+        tokens, _, allowed = self.backend.update(
+            ('rate-limit', key), take, ttl=period)
+
+        return RateLimit(
+            limit=capacity,
+            remaining=int(tokens),
+            reset=math.ceil((capacity - tokens) / rate),
+            retry_after=None if allowed else math.ceil((1 - tokens) / rate))
+
+
+def create_limiter_backend(config):
+    """Cache of the token buckets, apart from the cached data"""
+    if config.CACHE_BACKEND == 'shared':
+        # A bucket takes a few dozen bytes once pickled
+        return SharedMemoryCache(
+            config.RATE_LIMIT_CACHE_PATH, slots=config.RATE_LIMIT_CACHE_SIZE,
+            slot_size=512)
+    return LRUCache(maxsize=config.RATE_LIMIT_CACHE_SIZE)
+
+
+limiter = TokenBucketLimiter(create_limiter_backend(Config))
+
+
+def client_identity():
+    """The API key of an authenticated client, its address otherwise"""
+    key = g.get('auth_key')
+    if key:
+        return f"key:{key.id}"
+    return f"ip:{request.remote_addr}"
+
+
+def rate_limited(group):
+    """
+    Limits how often each client calls the route to RATE_LIMITS[group]
+    requests per minute. Put it after `authenticate` so authenticated clients
+    are told apart by their API key.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not current_app.config['RATE_LIMIT_ENABLED']:
+                return func(*args, **kwargs)
+
+            capacity = current_app.config['RATE_LIMITS'][group]
+            rate_limit = limiter.hit((group, client_identity()), capacity)
+
+            # Also runs for the response of the 429 error handler
+            @after_this_request
+            def add_headers(response):
+                response.headers['X-RateLimit-Limit'] = str(rate_limit.limit)
+                response.headers['X-RateLimit-Remaining'] = str(rate_limit.remaining)
+                response.headers['X-RateLimit-Reset'] = str(rate_limit.reset)
+                if rate_limit.retry_after is not None:
+                    response.headers['Retry-After'] = str(rate_limit.retry_after)
+                return response
+
+            if rate_limit.retry_after is not None:
+                rate_limited_counter.labels(group=group).inc()
+                abort(429)
+
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
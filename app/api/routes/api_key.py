@@ -3,6 +3,8 @@ from flask import g, request
 from app import db, utils as utils
 from app.api import bp
 from app.api.auth import authenticate, create_new_apikey, is_user_oc_member, rotate_key
+from app.api.oc_api import OCApiError
+from app.api.rate_limit import rate_limited
 from app.api.routes.helpers import (
     unauthorized_response, failures_counter, latency_summary, logger)
 from app.api.validations import requires_body
@@ -12,6 +14,7 @@ from app.models import Key
 @latency_summary.time()
 @failures_counter.count_exceptions()
 @bp.route('/apikey', methods=['POST'], endpoint='apikey')
+@rate_limited('apikey')
 @requires_body
 def apikey():
     """
@@ -22,7 +25,11 @@ def apikey():
     json = request.get_json()
     email = json.get('email')
     password = json.get('password')
-    is_oc_member = is_user_oc_member(email, password)
+    try:
+        is_oc_member = is_user_oc_member(email, password)
+    except OCApiError as e:
+        logger.exception(e)
+        return utils.standardize_response(status_code=503)
 
     if not is_oc_member:
         return unauthorized_response()
@@ -55,6 +62,7 @@ def apikey():
 @failures_counter.count_exceptions()
 @bp.route('/apikey/rotate', methods=['POST'], endpoint='rotate_apikey')
 @authenticate
+@rate_limited('apikey')
 def rotate_apikey():
     new_key = rotate_key(g.auth_key, db.session)
     if not new_key:
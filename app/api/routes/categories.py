@@ -2,13 +2,17 @@ from flask import redirect
 
 from app import utils as utils
 from app.api import bp
-from app.api.routes.helpers import failures_counter, latency_summary, logger
+from app.api.rate_limit import rate_limited
+from app.api.routes.helpers import (
+    conditional, failures_counter, latency_summary, logger)
+from app.cache import response_cache, response_cache_key
 from app.models import Category
 
 
 @latency_summary.time()
 @failures_counter.count_exceptions()
 @bp.route('/categories', methods=['GET'])
+@rate_limited('read')
 def categories():
     return get_categories()
 
@@ -16,30 +20,38 @@ def categories():
 @latency_summary.time()
 @failures_counter.count_exceptions()
 @bp.route('/categories/<int:id>', methods=['GET'], endpoint='get_category')
+@rate_limited('read')
 def category(id):
     return get_category(id)
 
 
+@conditional
 def get_categories():
-    try:
-        categories = Category.query.all()
+    cache_key = response_cache_key()
+    generation = response_cache.generation()
+    payload = response_cache.get(cache_key, generation=generation)
 
-        if not categories:
-            return redirect('/404')
-        category_list = [
-            category.serialize for category in categories
-        ]
-        details = {'details': {'total_count': len(categories)}}
-    except Exception as e:
-        logger.exception(e)
-        return utils.standardize_response(status_code=500)
+    if payload is None:
+        try:
+            categories = Category.query.all()
 
-    return utils.standardize_response(payload=dict(
-        data=category_list,
-        **details),
-        datatype="categories")
+            if not categories:
+                return redirect('/404')
+            category_list = [
+                category.serialize for category in categories
+            ]
+            details = {'details': {'total_count': len(categories)}}
+        except Exception as e:
+            logger.exception(e)
+            return utils.standardize_response(status_code=500)
 
+        payload = dict(data=category_list, **details)
+        response_cache.set(cache_key, payload, generation=generation)
 
+    return utils.standardize_response(payload=payload, datatype="categories")
+
+
+@conditional
 def get_category(id):
     category = Category.query.get(id)
 
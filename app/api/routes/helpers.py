@@ -1,7 +1,16 @@
+import functools
+import hashlib
+from datetime import timezone
+
+from dateutil import parser
+from flask import g, make_response, request
 from prometheus_client import Counter, Summary
+from sqlalchemy import func, text
+from sqlalchemy.dialects import postgresql
 
-from app import utils as utils
-from app.models import Category, Language
+from app import db, utils as utils
+from app.cache import catalog_version_cache, response_cache_key
+from app.models import Category, Language, Resource, VoteInformation
 
 logger = utils.setup_logger('routes_logger')
 latency_summary = Summary('request_latency_seconds', 'Length of request')
@@ -15,21 +24,153 @@ def unauthorized_response():
     return utils.standardize_response(payload=payload, status_code=401)
 
 
-def get_attributes(json):
-    languages_list = Language.query.all()
-    categories_list = Category.query.all()
+class AttributeResolver:
+    """Categories and languages of the resources of a request, looked up in bulk"""
+
+    def __init__(self):
+        self._categories = {}
+        self._languages = {}
+
+    def resolve(self, rlist):
+        """Looks up the category and languages of every resource in `rlist`"""
+        category_names = {str(r['category']) for r in rlist
+                          if r.get('category') is not None} - set(self._categories)
+        language_names = {lang.lower(): lang for r in rlist
+                          for lang in r.get('languages') or []
+                          if lang.lower() not in self._languages}
+
+        if category_names:
+            self._categories.update(
+                (category.name, category) for category in
+                Category.query.filter(Category.name.in_(category_names)))
+        if language_names:
+            self._languages.update(
+                (language.name.lower(), language) for language in
+                Language.query.filter(func.lower(Language.name).in_(language_names)))
+
+        for name in category_names:
+            self._categories.setdefault(name, Category(name=name))
+        for key, name in language_names.items():
+            self._languages.setdefault(key, Language(name=name))
+
+    def category(self, json):
+        """Category of the resource `json`, None when it has none"""
+        if json.get('category') is None:
+            return None
+        self.resolve([json])
+        return self._categories[str(json['category'])]
+
+    def languages(self, json):
+        """Languages of the resource `json`"""
+        self.resolve([json])
+        return [self._languages[lang.lower()] for lang in json.get('languages') or []]
+
+
+def insert_ignore(table, **values):
+    """INSERT of a row that is skipped if it conflicts with an existing one"""
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(table).values(**values).on_conflict_do_nothing()
+    # SQLite, used by the tests
+    return table.insert().values(**values).prefix_with('OR IGNORE')
+
+
+def get_vote_directions(apikey, resource_ids):
+    """{resource_id: direction} of the votes `apikey` cast on `resource_ids`"""
+    if not apikey or not resource_ids:
+        return {}
+
+    votes = VoteInformation.query.filter(
+        VoteInformation.voter_apikey == apikey,
+        VoteInformation.resource_id.in_(resource_ids)
+    )
+    return {vote.resource_id: vote.current_direction for vote in votes}
+
+
+def with_vote_directions(payload, apikey):
+    """Copy of a cached payload with the `user_vote_direction` of the caller"""
+    if not apikey:
+        return payload
+
+    data = payload['data']
+    resources = data if isinstance(data, list) else [data]
+    vote_directions = get_vote_directions(
+        apikey, [resource['id'] for resource in resources])
+    resources = [
+        dict(resource, user_vote_direction=vote_directions.get(resource['id']))
+        for resource in resources
+    ]
+
+    return dict(payload, data=resources if isinstance(data, list) else resources[0])
+
+
+def estimate_row_count(model):
+    """Planner estimate of the number of rows of `model`, None if unavailable"""
+    if db.engine.dialect.name != 'postgresql':
+        return None
+
+    estimate = db.session.execute(
+        text("SELECT reltuples::bigint FROM pg_class "
+             "WHERE oid = CAST(:table AS regclass)"),
+        {'table': model.__tablename__}
+    ).scalar()
+    return estimate if estimate and estimate > 0 else None
+
+
+def catalog_version():
+    """(version, last_modified) of the catalog"""
+    generation = catalog_version_cache.generation()
+    version = catalog_version_cache.get('catalog', generation=generation)
+    if version is None:
+        count, created_at, updated_at = db.session.query(
+            func.count(Resource.id),
+            func.max(Resource.created_at),
+            func.max(Resource.last_updated)
+        ).one()
+        timestamps = [as_utc(t) for t in (created_at, updated_at) if t is not None]
+        last_modified = max(timestamps) if timestamps else None
+        version = (f"{count}-{created_at}-{updated_at}", last_modified)
+        catalog_version_cache.set('catalog', version, generation=generation)
+    return version
+
+
+def as_utc(timestamp):
+    """Naive UTC datetime, truncated to the precision of HTTP dates"""
+    if isinstance(timestamp, str):
+        # SQLite returns the aggregates of timestamps as text
+        timestamp = parser.parse(timestamp)
+    if timestamp.tzinfo:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp.replace(microsecond=0)
+
+
+def conditional(func):
+    """Answers GETs with 304 Not Modified while their ETag is still current"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        version, last_modified = catalog_version()
+        auth_key = g.get('auth_key')
+        # Resources include the caller's votes, so the tag depends on the caller
+        apikey = auth_key.apikey if auth_key else None
+        etag = hashlib.sha256(
+            repr((version, response_cache_key(), apikey)).encode()).hexdigest()
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = bool(
+                request.if_modified_since and last_modified
+                and last_modified <= as_utc(request.if_modified_since)
+            )
 
-    language_dict = {lang.key().lower(): lang for lang in languages_list}
-    category_dict = {c.key(): c for c in categories_list}
+        response = make_response('', 304) if not_modified \
+            else make_response(func(*args, **kwargs))
 
-    langs = []
-    for lang in json.get('languages') or []:
-        language = language_dict.get(lang.lower())
-        if not language:
-            language = Language(name=lang)
-        langs.append(language)
-    categ = category_dict.get(json.get('category'), Category(name=json.get('category')))
-    return (langs, categ)
+        if response.status_code in (200, 304):
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.vary.update(['x-apikey', 'Authorization', 'x-api-version'])
+        return response
+    return wrapper
 
 
 def ensure_bool(string):
@@ -2,13 +2,17 @@ from flask import redirect
 
 from app import utils as utils
 from app.api import bp
-from app.api.routes.helpers import failures_counter, latency_summary, logger
+from app.api.rate_limit import rate_limited
+from app.api.routes.helpers import (
+    conditional, failures_counter, latency_summary, logger)
+from app.cache import response_cache, response_cache_key
 from app.models import Language
 
 
 @latency_summary.time()
 @failures_counter.count_exceptions()
 @bp.route('/languages', methods=['GET'])
+@rate_limited('read')
 def languages():
     return get_languages()
 
@@ -16,30 +20,38 @@ def languages():
 @latency_summary.time()
 @failures_counter.count_exceptions()
 @bp.route('/languages/<int:id>', methods=['GET'], endpoint='get_language')
+@rate_limited('read')
 def language(id):
     return get_language(id)
 
 
+@conditional
 def get_languages():
-    try:
-        languages = Language.query.all()
+    cache_key = response_cache_key()
+    generation = response_cache.generation()
+    payload = response_cache.get(cache_key, generation=generation)
 
-        if not languages:
-            return redirect('/404')
-        language_list = [
-            language.serialize for language in languages
-        ]
-        details = {'details': {'total_count': len(languages)}}
-    except Exception as e:
-        logger.exception(e)
-        return utils.standardize_response(status_code=500)
+    if payload is None:
+        try:
+            languages = Language.query.all()
 
-    return utils.standardize_response(payload=dict(
-        data=language_list,
-        **details),
-        datatype="languages")
+            if not languages:
+                return redirect('/404')
+            language_list = [
+                language.serialize for language in languages
+            ]
+            details = {'details': {'total_count': len(languages)}}
+        except Exception as e:
+            logger.exception(e)
+            return utils.standardize_response(status_code=500)
 
+        payload = dict(data=language_list, **details)
+        response_cache.set(cache_key, payload, generation=generation)
 
+    return utils.standardize_response(payload=payload, datatype="languages")
+
+
+@conditional
 def get_language(id):
     language = Language.query.get(id)
 
@@ -1,16 +1,17 @@
-from os import environ
-
-from algoliasearch.exceptions import AlgoliaException, AlgoliaUnreachableHostException
-from flask import request
+from flask import current_app, request
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 
-from app import db, index, utils as utils
+from app import db, utils as utils
 from app.api import bp
+from app.cache import invalidate_catalog
 from app.api.auth import authenticate
+from app.api.rate_limit import rate_limited
 from app.api.routes.helpers import (
-    failures_counter, get_attributes, latency_summary, logger, ensure_bool)
+    AttributeResolver, failures_counter, latency_summary, logger, ensure_bool)
 from app.api.validations import requires_body, validate_resource_list, wrong_type
 from app.models import Resource
+from app.outbox import enqueue_index_writes, outbox_worker
 
 
 @latency_summary.time()
@@ -18,6 +19,7 @@ from app.models import Resource
 @bp.route('/resources', methods=['POST'], endpoint='create_resources')
 @requires_body
 @authenticate
+@rate_limited('write')
 def post_resources():
     json = request.get_json()
 
@@ -34,59 +36,46 @@ def post_resources():
 
 def create_resources(json, db):
     try:
-        # Resources to return in the response
-        created_resources = []
-        # Serialized Resources to send to Algolia
-        created_resources_algolia = []
-        # Resource IDs to delete if Algolia fails to index
-        resource_id_cache = []
+        resolver = AttributeResolver()
+        resolver.resolve(json)
 
-        # Create each Resource in the database one by one
-        for resource in json:
-            langs, categ = get_attributes(resource)
-            free_bool = ensure_bool(resource.get('free'))
-            new_resource = Resource(
+        # Created in a single transaction: all of them or none
+        new_resources = [
+            Resource(
                 name=resource.get('name'),
                 url=resource.get('url'),
-                category=categ,
-                languages=langs,
-                free=free_bool,
+                category=resolver.category(resource),
+                languages=resolver.languages(resource),
+                free=ensure_bool(resource.get('free')),
                 notes=resource.get('notes'))
+            for resource in json
+        ]
 
-            try:
-                db.session.add(new_resource)
-                db.session.commit()
-                created_resources_algolia.append(new_resource.serialize_algolia_search)
-                resource_id_cache.append(new_resource.id)
-
-            except IntegrityError as e:
-                logger.exception(e)
-                return utils.standardize_response(status_code=422)
-
-            except Exception as e:
-                logger.exception(e)
-                return utils.standardize_response(status_code=500)
-
-            created_resources.append(new_resource.serialize())
-
-        # Take all the created resources and save them in Algolia with one API call
         try:
-            index.save_objects(created_resources_algolia)
-
-        except (AlgoliaUnreachableHostException, AlgoliaException) as e:
-            if (environ.get("FLASK_ENV") != 'development'):
-                logger.exception(e)
-
-                # Remove created resources from the db to stay in sync with Algolia
-                for res_id in resource_id_cache:
-                    res = Resource.query.get(res_id)
-                    res.languages.clear()
-                    db.session.delete(res)
-                db.session.commit()
-
-                msg = "Algolia failed to index resources"
-                error = {'errors': [{"algolia-failed": {"message": msg}}]}
-                return utils.standardize_response(payload=error, status_code=500)
+            db.session.add_all(new_resources)
+            # Indexed by the outbox worker once committed
+            enqueue_index_writes(new_resources)
+            ids = [resource.id for resource in new_resources]
+            db.session.commit()
+
+        except IntegrityError as e:
+            logger.exception(e)
+            db.session.rollback()
+            # URLs taken since they were validated
+            validation_errors = validate_resource_list(request.method, json)
+            if validation_errors:
+                return utils.standardize_response(
+                    payload=validation_errors, status_code=422)
+            return utils.standardize_response(status_code=422)
+
+        # Reloads the committed resources together rather than one by one
+        created = {resource.id: resource for resource in Resource.query.options(
+            joinedload(Resource.category), selectinload(Resource.languages)
+        ).filter(Resource.id.in_(ids))}
+        created_resources = [created[id].serialize() for id in ids]
+
+        invalidate_catalog()
+        outbox_worker.notify(current_app._get_current_object())
 
         # Success
         return utils.standardize_response(
@@ -1,16 +1,19 @@
-from os import environ
-
-from algoliasearch.exceptions import AlgoliaException, AlgoliaUnreachableHostException
-from flask import redirect, request, g
+from flask import current_app, redirect, request, g
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 
-from app import db, index, utils as utils
+from app import db, utils as utils
 from app.api import bp
 from app.api.auth import authenticate
+from app.api.rate_limit import rate_limited
+from app.cache import invalidate_catalog
+from app.clicks import click_buffer
 from app.api.routes.helpers import (
-    failures_counter, get_attributes, latency_summary, logger, ensure_bool)
+    AttributeResolver, failures_counter, get_vote_directions, insert_ignore,
+    latency_summary, logger, ensure_bool)
 from app.api.validations import requires_body, validate_resource, wrong_type
-from app.models import Resource, VoteInformation, Key
+from app.models import Resource, VoteInformation, language_identifier
+from app.outbox import enqueue_index_writes, outbox_worker
 import json as json_module
 
 
@@ -19,6 +22,7 @@ import json as json_module
 @bp.route('/resources/<int:id>', methods=['PUT'], endpoint='update_resource')
 @requires_body
 @authenticate
+@rate_limited('write')
 def put_resource(id):
     json = request.get_json()
 
@@ -40,69 +44,42 @@ def update_resource(id, json, db):
     if not resource:
         return redirect('/404')
 
-    langs, categ = get_attributes(json)
-    index_object = {'objectID': id}
-
-    def get_unique_resource_categories_as_strings():
-        resources = Resource.query.all()
-        return {resource.category.name for resource in resources}
-
-    def get_unique_resource_languages_as_strings():
-        resources = Resource.query.all()
-        return {language.name
-                for resource in resources
-                for language in resource.languages}
+    resolver = AttributeResolver()
+    vote_directions = get_vote_directions(api_key, [id])
 
     try:
         logger.info(
             f"Updating resource. Old data: "
-            f"{json_module.dumps(resource.serialize(api_key))}")
+            f"{json_module.dumps(resource.serialize(api_key, vote_directions))}")
         if json.get('languages') is not None:
             old_languages = resource.languages[:]
-            resource.languages = langs
-            index_object['languages'] = resource.serialize(api_key)['languages']
-            resource_languages = get_unique_resource_languages_as_strings()
-            for language in old_languages:
-                if language.name not in resource_languages:
-                    db.session.delete(language)
+            resource.languages = resolver.languages(json)
+            for language in unused_languages(old_languages):
+                db.session.delete(language)
         if json.get('category'):
             old_category = resource.category
-            resource.category = categ
-            index_object['category'] = categ.name
-            resource_categories = get_unique_resource_categories_as_strings()
-            if old_category.name not in resource_categories:
+            resource.category = resolver.category(json)
+            if not category_in_use(old_category):
                 db.session.delete(old_category)
         if json.get('name'):
             resource.name = json.get('name')
-            index_object['name'] = json.get('name')
         if json.get('url'):
             resource.url = json.get('url')
-            index_object['url'] = json.get('url')
         if 'free' in json:
             free = ensure_bool(json.get('free'))
             resource.free = free
-            index_object['free'] = free
         if 'notes' in json:
             resource.notes = json.get('notes')
-            index_object['notes'] = json.get('notes')
 
-        try:
-            index.partial_update_object(index_object)
-
-        except (AlgoliaUnreachableHostException, AlgoliaException) as e:
-            if environ.get("FLASK_ENV") != 'development':
-                logger.exception(e)
-                msg = f"Algolia failed to update index for resource '{resource.name}'"
-                logger.warn(msg)
-                error = {'errors': [{"algolia-failed": {"message": msg}}]}
-                return utils.standardize_response(payload=error, status_code=500)
-
-        # Wait to commit the changes until we know that Aloglia was updated
+        # Indexed by the outbox worker once committed
+        enqueue_index_writes([resource])
         db.session.commit()
+        invalidate_catalog()
+        outbox_worker.notify(current_app._get_current_object())
 
         return utils.standardize_response(
             payload=dict(
-                data=resource.serialize(api_key)
+                data=resource.serialize(api_key, vote_directions)
             ),
             datatype="resource"
         )
@@ -116,10 +93,29 @@ def update_resource(id, json, db):
         return utils.standardize_response(status_code=500)
 
 
+def category_in_use(category):
+    """Whether a resource still has `category`, with an EXISTS query"""
+    return db.session.query(
+        Resource.query.filter(Resource.category_id == category.id).exists()
+    ).scalar()
+
+
+def unused_languages(languages):
+    """The ones of `languages` that no resource has anymore, in one query"""
+    if not languages:
+        return []
+    in_use = {language_id for language_id, in db.session.query(
+        language_identifier.c.language_id.distinct()
+    ).filter(language_identifier.c.language_id.in_(
+        [language.id for language in languages]))}
+    return [language for language in languages if language.id not in in_use]
+
+
 @latency_summary.time()
 @failures_counter.count_exceptions()
 @bp.route('/resources/<int:id>/<string:vote_direction>', methods=['PUT'])
 @authenticate
+@rate_limited('vote')
 def change_votes(id, vote_direction):
     return update_votes(id, f"{vote_direction}s") \
         if vote_direction in ['upvote', 'downvote'] else redirect('/404')
@@ -129,67 +125,85 @@ def change_votes(id, vote_direction):
 @failures_counter.count_exceptions()
 @bp.route('/resources/<int:id>/click', methods=['PUT'])
 @authenticate(allow_no_auth_key=True)
+@rate_limited('click')
 def update_resource_click(id):
     return add_click(id)
 
 
 def update_votes(id, vote_direction_attribute):
-    resource = Resource.query.get(id)
-
-    if not resource:
+    """
+    Casts, switches or withdraws the caller's vote on the resource in one short
+    transaction. The vote is upserted and locked before being read, and the
+    counters are changed in SQL, so parallel votes never overwrite each other.
+    """
+    if not db.session.query(Resource.id).filter(Resource.id == id).scalar():
         return redirect('/404')
 
-    initial_count = getattr(resource, vote_direction_attribute)
-    vote_direction = vote_direction_attribute[:-1]
-
-    opposite_direction_attribute = 'downvotes' \
-        if vote_direction_attribute == 'upvotes' else 'upvotes'
-    opposite_direction = opposite_direction_attribute[:-1]
-    opposite_count = getattr(resource, opposite_direction_attribute)
-
     api_key = g.auth_key.apikey
-    vote_info = VoteInformation.query.get(
-                {'voter_apikey': api_key, 'resource_id': id}
-            )
-
-    if vote_info is None:
-        voter = Key.query.filter_by(apikey=api_key).first()
-        new_vote_info = VoteInformation(
-            voter_apikey=api_key,
-            resource_id=resource.id,
-            current_direction=vote_direction
-        )
-        new_vote_info.voter = voter
-        resource.voters.append(new_vote_info)
-        setattr(resource, vote_direction_attribute, initial_count + 1)
-    else:
-        if vote_info.current_direction == vote_direction:
-            setattr(resource, vote_direction_attribute, initial_count - 1)
-            setattr(vote_info, 'current_direction', None)
-        else:
-            setattr(resource, opposite_direction_attribute, opposite_count - 1) \
-                if vote_info.current_direction == opposite_direction else None
-            setattr(resource, vote_direction_attribute, initial_count + 1)
-            setattr(vote_info, 'current_direction', vote_direction)
+    vote_direction = vote_direction_attribute[:-1]
+    vote_filter = (VoteInformation.voter_apikey == api_key,
+                   VoteInformation.resource_id == id)
+
+    db.session.execute(insert_ignore(
+        VoteInformation.__table__, voter_apikey=api_key, resource_id=id))
+    previous_direction = db.session.query(VoteInformation.current_direction) \
+        .filter(*vote_filter).with_for_update().scalar()
+    current_direction = None if previous_direction == vote_direction \
+        else vote_direction
+
+    deltas = {}
+    if previous_direction:
+        deltas[f"{previous_direction}s"] = -1
+    if current_direction:
+        deltas[f"{current_direction}s"] = 1
+    counters = {
+        attribute: func.coalesce(getattr(Resource, attribute), 0) + delta
+        for attribute, delta in deltas.items()
+    }
+
+    db.session.query(VoteInformation).filter(*vote_filter).update(
+        {'current_direction': current_direction}, synchronize_session=False)
+    db.session.query(Resource).filter(Resource.id == id).update(
+        counters, synchronize_session=False)
     db.session.commit()
+    invalidate_catalog()
 
+    resource = Resource.query.get(id)
+    vote_directions = {resource.id: current_direction}
     return utils.standardize_response(
-        payload=dict(data=resource.serialize(api_key)),
+        payload=dict(data=resource.serialize(api_key, vote_directions)),
         datatype="resource"
     )
 
 
 def add_click(id):
-    resource = Resource.query.get(id)
+    """
+    Counts a click on the resource. Clicks are buffered and written in batches
+    by `click_buffer`, so the response includes the clicks not written yet.
+    """
     api_key = g.auth_key.apikey if g.auth_key else None
 
+    if current_app.config['CLICK_RESPONSE_ACCEPTED']:
+        if not db.session.query(Resource.id).filter(Resource.id == id).scalar():
+            return redirect('/404')
+
+        click_buffer.add(id, current_app._get_current_object())
+        return utils.standardize_response(
+            payload=dict(data={'id': id}),
+            status_code=202,
+            datatype="resource")
+
+    resource = Resource.query.get(id)
     if not resource:
         return redirect('/404')
 
-    initial_count = getattr(resource, 'times_clicked')
-    setattr(resource, 'times_clicked', initial_count + 1)
-    db.session.commit()
+    # The count read above, with the clicks not written yet. A click written
+    # right away expires the resource, which reloads it
+    click_buffer.add(id, current_app._get_current_object())
 
+    vote_directions = get_vote_directions(api_key, [resource.id])
+    data = resource.serialize(api_key, vote_directions)
+    data['times_clicked'] = (data['times_clicked'] or 0) + click_buffer.pending(id)
     return utils.standardize_response(
-        payload=dict(data=resource.serialize(api_key)),
+        payload=dict(data=data),
         datatype="resource")
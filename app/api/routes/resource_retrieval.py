@@ -1,13 +1,19 @@
 from datetime import datetime
+from functools import partial
 
 from dateutil import parser
 from flask import redirect, request, g
-from sqlalchemy import func, or_, text
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import joinedload, selectinload
 
 from app import utils as utils
 from app.api import bp
 from app.api.auth import authenticate
-from app.api.routes.helpers import failures_counter, latency_summary, logger
+from app.api.rate_limit import rate_limited
+from app.api.routes.helpers import (
+    conditional, estimate_row_count, failures_counter, latency_summary, logger,
+    with_vote_directions)
+from app.cache import response_cache, response_cache_key
 from app.models import Category, Language, Resource
 from configs import Config
 
@@ -27,6 +33,8 @@ def resource(id):
 
 
 @authenticate(allow_no_auth_key=True)
+@rate_limited('read')
+@conditional
 def get_resources():
     """
     Gets a paginated list of resources.
@@ -35,6 +43,38 @@ def get_resources():
     in the request, the list will be filtered by these parameters.
 
     The filters are case insensitive.
+
+    The URL parameter `count` picks how `total_count` is computed: `exact`
+    always counts, `estimate` uses the database's statistics for unfiltered
+    listings and `none` skips counting. By default the count is cached per
+    filter set until a resource is created or updated.
+
+    Passing a `cursor` URL parameter (empty for the first page) switches to
+    keyset pagination, where each page links to the next by `next_cursor`.
+    """
+    api_key = g.auth_key.apikey if g.auth_key else None
+    cache_key = response_cache_key()
+    generation = response_cache.generation()
+    payload = response_cache.get(cache_key, generation=generation)
+
+    if payload is None:
+        response = list_resources()
+        if isinstance(response, dict):
+            payload = response
+            response_cache.set(cache_key, payload, generation=generation)
+        else:
+            return response
+
+    return utils.standardize_response(
+        payload=with_vote_directions(payload, api_key),
+        datatype="resources"
+    )
+
+
+def list_resources():
+    """
+    Builds the payload of `get_resources` as an anonymous caller would see it.
+    Returns an error response instead when the request can't be served.
     """
     resource_paginator = utils.Paginator(Config.RESOURCE_PAGINATOR, request)
 
@@ -43,9 +83,15 @@ def get_resources():
     category = request.args.get('category')
     updated_after = request.args.get('updated_after')
     free = request.args.get('free')
-    api_key = g.auth_key.apikey if g.auth_key else None
-
-    q = Resource.query
+    uaDate = None
+    freeAsBool = None
+
+    # Load the category and languages of the whole page up front instead of
+    # lazily loading them for every resource during serialization
+    q = Resource.query.options(
+        joinedload(Resource.category),
+        selectinload(Resource.languages)
+    )
 
     # Filter on languages
     if languages:
@@ -89,23 +135,41 @@ def get_resources():
         freeAsBool = free.lower() == 'true'
         q = q.filter(Resource.free == freeAsBool)
 
+    # Identifies the total count of this filter set in the count cache
+    filters = (
+        tuple(sorted({language.lower() for language in languages})),
+        category.lower() if category else None,
+        uaDate,
+        freeAsBool
+    )
+    count_key = ('resources',) + filters
+    # The table statistics can only estimate the unfiltered listing
+    estimate = partial(estimate_row_count, Resource) \
+        if filters == ((), None, None, None) else None
+
     # Order by "getting started" category
-    if not languages and not category and free is None:
+    show_first = None
+    if resource_paginator.uses_cursor or (
+            not languages and not category and free is None):
         show_first = Category.query.filter(Category.name == "Getting Started").first()
-        clause = (
-            f" CASE resource.category_id"
-            f"   WHEN {show_first.id} THEN 1"
-            f"   ELSE 2"
-            f" END, id"
-        )
-        q = q.order_by(text(clause))
+    sort_columns = [Resource.id]
+    if show_first:
+        rank = case([(Resource.category_id == show_first.id, 1)], else_=2)
+        sort_columns.insert(0, rank)
+
+    if resource_paginator.uses_cursor:
+        return list_resources_after_cursor(resource_paginator, q, sort_columns)
+
+    if show_first:
+        q = q.order_by(*sort_columns)
 
     try:
-        paginated_resources = resource_paginator.paginated_data(q)
+        paginated_resources = resource_paginator.paginated_data(
+            q, count_key, estimate)
         if not paginated_resources:
             return redirect('/404')
         resource_list = [
-            item.serialize(api_key)
+            item.serialize(vote_directions={})
             for item in paginated_resources.items
         ]
         details = resource_paginator.details(paginated_resources)
@@ -113,20 +177,58 @@ def get_resources():
         logger.exception(e)
         return utils.standardize_response(status_code=500)
 
-    return utils.standardize_response(
-        payload=dict(data=resource_list, **details),
-        datatype="resources"
-    )
+    return dict(data=resource_list, **details)
+
+
+def list_resources_after_cursor(resource_paginator, q, sort_columns):
+    """
+    Cursor mode of `list_resources`: pages through the same ordering using the
+    opaque `next_cursor` of the previous page instead of page numbers.
+    """
+    try:
+        cursor_page = resource_paginator.cursor_data(q, sort_columns)
+    except utils.InvalidCursor as e:
+        logger.exception(e)
+        message = 'The value for "cursor" is invalid'
+        res = {"errors": {"unprocessable-entity": {"message": message}}}
+        return utils.standardize_response(payload=res, status_code=422)
+    except Exception as e:
+        logger.exception(e)
+        return utils.standardize_response(status_code=500)
+
+    if not cursor_page.items:
+        return redirect('/404')
+
+    try:
+        resource_list = [
+            item.serialize(vote_directions={})
+            for item in cursor_page.items
+        ]
+        details = resource_paginator.cursor_details(cursor_page)
+    except Exception as e:
+        logger.exception(e)
+        return utils.standardize_response(status_code=500)
+
+    return dict(data=resource_list, **details)
 
 
 @authenticate(allow_no_auth_key=True)
+@rate_limited('read')
+@conditional
 def get_resource(id):
-    resource = Resource.query.get(id)
     api_key = g.auth_key.apikey if g.auth_key else None
+    cache_key = response_cache_key()
+    generation = response_cache.generation()
+    payload = response_cache.get(cache_key, generation=generation)
 
-    if resource:
-        return utils.standardize_response(
-            payload=dict(data=(resource.serialize(api_key))),
-            datatype="resource")
+    if payload is None:
+        resource = Resource.query.get(id)
+        if not resource:
+            return redirect('/404')
 
-    return redirect('/404')
+        payload = dict(data=resource.serialize(vote_directions={}))
+        response_cache.set(cache_key, payload, generation=generation)
+
+    return utils.standardize_response(
+        payload=with_vote_directions(payload, api_key),
+        datatype="resource")
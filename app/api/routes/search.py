@@ -1,15 +1,18 @@
 from algoliasearch.exceptions import AlgoliaException, AlgoliaUnreachableHostException
-from flask import redirect, request
+from flask import current_app, redirect, request
 
-from app import index, utils as utils
+from app import utils as utils
 from app.api import bp
+from app.api.rate_limit import rate_limited
 from app.api.routes.helpers import failures_counter, latency_summary, logger
+from app.search import cached_search, search_backends
 from configs import Config
 
 
 @latency_summary.time()
 @failures_counter.count_exceptions()
 @bp.route('/search', methods=['GET'])
+@rate_limited('search')
 def search():
     return search_results()
 
@@ -23,48 +26,29 @@ def search_results():
     free = request.args.get('free')
     category = request.args.get('category')
     languages = request.args.getlist('languages')
-    filters = []
-
-    # Filter on free
-    if free:
-        free = free.lower()
-        # algolia filters boolean attributes with either 0 or 1
-        if free == 'true':
-            filters.append('free=1')
-        elif free == 'false':
-            filters.append('free=0')
-
-    # Filter on category
-    if category:
-        # to not let double quotes conflict with algolia filter format
-        category = category.replace('"', "'")
-
-        filters.append(
-            f'category: "{category}"'
-        )
-
-    # Filter on languages
-    if languages and '' not in languages:
-        for i, _ in enumerate(languages):
-            # to not let double quotes conflict with algolia filter format
-            languages[i] = 'languages:"{}"'.format(languages[i].replace('"', "'"))
-
-        # joining all possible language values to algolia filter query
-        filters.append(f"( {' OR '.join(languages)} )")
+
+    # Invalid free values don't filter
+    free = {'true': True, 'false': False}.get(free.lower()) if free else None
+
+    if '' in languages:
+        languages = []
+
+    search_params = dict(free=free, category=category, languages=languages,
+                         page=page, page_size=page_size)
 
     try:
-        search_result = index.search(f'{term}', {
-            'filters': " AND ".join(filters),
-            'page': page,
-            'hitsPerPage': page_size
-        })
+        search_result = cached_search(term, **search_params)
 
-    except (AlgoliaUnreachableHostException, AlgoliaException) as e:
+    except AlgoliaUnreachableHostException as e:
         logger.exception(e)
-        msg = "Failed to get resources from Algolia"
-        logger.warn(msg)
-        error = {'errors': [{"algolia-failed": {"message": msg}}]}
-        return utils.standardize_response(payload=error, status_code=500)
+        if not current_app.config['SEARCH_FALLBACK']:
+            return algolia_failed_response()
+        logger.warning("Algolia is unreachable, searching the database instead")
+        search_result = search_backends['database'].search(term, **search_params)
+
+    except AlgoliaException as e:
+        logger.exception(e)
+        return algolia_failed_response()
 
     if page >= int(search_result['nbPages']):
         return redirect('/404')
@@ -82,3 +66,10 @@ def search_results():
     return utils.standardize_response(
         payload=dict(data=results, **details),
         datatype="resources")
+
+
+def algolia_failed_response():
+    msg = "Failed to get resources from Algolia"
+    logger.warn(msg)
+    error = {'errors': [{"algolia-failed": {"message": msg}}]}
+    return utils.standardize_response(payload=error, status_code=500)
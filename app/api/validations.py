@@ -37,8 +37,19 @@ def validate_resource_list(method, rlist):
         msg = f"This endpoint will accept a max of {max_resources} resources"
         return {"errors": [{"too-long": {"message": msg}}]}
 
+    # Every URL of the list is looked up with a single query
+    owners = url_owners(r.get('url') for r in rlist)
+    first_index = {}
+
     for i, r in enumerate(rlist):
-        validation = validate_resource(method, r)
+        duplicate_of = None
+        if r.get('url') is not None:
+            duplicate_of = first_index.setdefault(str(r.get('url')), i)
+            if duplicate_of == i:
+                duplicate_of = None
+
+        validation = validate_resource(method, r, owners=owners,
+                                       duplicate_of=duplicate_of)
         if validation:
             validation['index'] = i
             errors['errors'].append(validation)
@@ -47,49 +58,20 @@ def validate_resource_list(method, rlist):
         return errors
 
 
-def validate_resource(method, json, id=-1):
+def validate_resource(method, json, id=-1, owners=None, duplicate_of=None):
+    """
+    Validation errors of the resource `json`, None when it's valid.
+
+    owners -- {url: id} of the resources having the urls to validate, see
+    `url_owners`, looked up for this resource alone when not given
+    duplicate_of -- index of an earlier resource of the same list having the
+    same url
+    """
     errors = None
     validation_errors = {}
-    missing_params = {"params": []}
-    invalid_params = {"params": []}
-    required = []
-
-    for column in Resource.__table__.columns:
-        # strip _id from category_id
-        col_name = column.name.replace('_id', '')
-
-        # There are only required parameters for POSTing new resources.
-        if method == 'POST':
-            if column.nullable is False and col_name != 'id':
-                required.append(col_name)
-
-        # Type Validation.
-        col_type = column.type.python_type
-        field = json.get(col_name)
-
-        if field is not None:
-
-            # Category is a foreign key (int) relation but we only accept string input.
-            # The provided category will get mapped to this resource later on.
-            if col_name == 'category':
-                col_type = str
-
-            # Allow String columns to accept integers.
-            if col_type is str:
-                if type(field) in [int, float]:
-
-                    # Do not allow integers as urls
-                    if col_name != 'url':
-                        continue
-
-            # Allow Bool columns to accept strings that are variations "true" or "false"
-            if col_type is bool:
-                if type(field) is str and field.lower() in ["false", "true"]:
-                    continue
-
-            # Validate that fields are of the correct type.
-            if col_type is not type(field):
-                invalid_params["params"].append(col_name)
+    missing, invalid = resource_schema.check(method, json)
+    missing_params = {"params": missing}
+    invalid_params = {"params": invalid}
 
     # Special case for Languages - Must be list and all elements must be str.
     langs = json.get('languages')
@@ -97,22 +79,24 @@ def validate_resource(method, json, id=-1):
         if type(langs) is not list or not all(map(lambda x: type(x) is str, langs)):
             invalid_params["params"].append("languages")
 
-    for prop in required:
-        if json.get(prop) is None:
-            missing_params["params"].append(prop)
-
     url = json.get("url")
     if url is not None:
+        if owners is None:
+            owners = url_owners([url])
 
         # If there is an existing resource with the requested url
         # and it isn't the Resource we are trying to update, return an error.
-        resource = Resource.query.filter_by(url=url).first()
-        if resource and resource.id != id:
+        owner = owners.get(str(url))
+        if owner is not None and owner != id:
             invalid_params["params"].append('url')
-            message = f"Resource id {resource.id} already has this URL."
+            message = f"Resource id {owner} already has this URL."
             invalid_params["message"] = message
             invalid_params["resource"] = \
-                f"https://resources.operationcode.org/api/v1/{resource.id}"
+                f"https://resources.operationcode.org/api/v1/{owner}"
+        elif duplicate_of is not None:
+            invalid_params["params"].append('url')
+            message = f"Resource at index {duplicate_of} already has this URL."
+            invalid_params["message"] = message
 
     if missing_params["params"]:
         validation_errors[MISSING_PARAMS] = missing_params
@@ -133,6 +117,78 @@ def validate_resource(method, json, id=-1):
         return validation_errors
 
 
+class ResourceSchema:
+    """
+    The validation rules of the resource columns, worked out once from
+    `table` instead of for every resource validated.
+    """
+
+    def __init__(self, table):
+        # (param, types accepted as they are, coercion accepting other values)
+        self.fields = []
+        # Params there have to be when POSTing new resources
+        self.required = []
+
+        for column in table.columns:
+            if column.info.get('internal'):
+                continue
+
+            # strip _id from category_id
+            name = column.name.replace('_id', '')
+            if column.nullable is False and name != 'id':
+                self.required.append(name)
+
+            # Category is a foreign key (int) relation but we only accept string
+            # input. The provided category will get mapped to this resource later.
+            col_type = str if name == 'category' else column.type.python_type
+            types = (col_type,)
+            coerce = None
+
+            # Allow String columns to accept integers, but not as urls
+            if col_type is str and name != 'url':
+                types = (str, int, float)
+
+            # Allow Bool columns to accept strings that are variations of
+            # "true" or "false"
+            if col_type is bool:
+                coerce = is_bool_string
+
+            self.fields.append((name, types, coerce))
+
+    def check(self, method, json):
+        """The missing params and the params of the wrong type of `json`"""
+        invalid = []
+        for name, types, coerce in self.fields:
+            field = json.get(name)
+            if field is None or type(field) in types:
+                continue
+            if coerce is None or not coerce(field):
+                invalid.append(name)
+
+        # There are only required parameters for POSTing new resources.
+        missing = []
+        if method == 'POST':
+            missing = [name for name in self.required if json.get(name) is None]
+        return missing, invalid
+
+
+def is_bool_string(value):
+    return type(value) is str and value.lower() in ["false", "true"]
+
+
+resource_schema = ResourceSchema(Resource.__table__)
+
+
+def url_owners(urls):
+    """{url: id} of the existing resources having one of `urls`, in one query"""
+    urls = {str(url) for url in urls if url is not None}
+    if not urls:
+        return {}
+    return {str(url): id for id, url in
+            Resource.query.with_entities(Resource.id, Resource.url)
+            .filter(Resource.url.in_(urls))}
+
+
 def wrong_type(type_accepted, type_provided):
     types = {
         dict: "object",
@@ -0,0 +1,101 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler
+
+from prometheus_client import Counter
+
+from app.background import BackgroundThread
+from configs import Config
+
+dropped_records_counter = Counter(
+    'audit_log_dropped_records', 'Audit log records dropped because the queue was full')
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as a JSON object per line. Records logged with a dict as
+    message get its fields, byte strings being decoded.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update({
+                name: value.decode('utf-8', 'replace') if isinstance(value, bytes)
+                else value
+                for name, value in record.msg.items()
+            })
+        else:
+            entry['message'] = record.getMessage()
+        return json.dumps(entry, default=str)
+
+
+class AsyncLogHandler(QueueHandler):
+    """
+    Queues records for a background thread that formats them and writes them
+    with `handler`, so logging doesn't make requests wait on the output.
+
+    At most `maxsize` records wait in the queue, records logged while it's
+    full are dropped and counted in `audit_log_dropped_records`. The records
+    left are written when the process exits.
+    """
+
+    def __init__(self, handler, maxsize=1000):
+        super().__init__(queue.Queue(maxsize))
+        self.handler = handler
+        self.maxsize = maxsize
+        self._thread = BackgroundThread('audit-log', self._run)
+        atexit.register(self.stop)
+
+    def prepare(self, record):
+        # Formatting is left to the background thread
+        return record
+
+    def enqueue(self, record):
+        self._thread.start(setup=self._new_queue)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records_counter.inc()
+
+    def stop(self):
+        """Writes the queued records and stops the background thread"""
+        if self._thread.running():
+            # Waits for room in the queue rather than failing when it's full
+            self.queue.put(None)
+        self._thread.stop()
+
+    def _new_queue(self):
+        # A worker doesn't share the queue of the process it was forked from
+        self.queue = queue.Queue(self.maxsize)
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            self.handler.handle(record)
+
+
+def create_audit_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    return AsyncLogHandler(handler, maxsize=Config.AUDIT_LOG_QUEUE_SIZE)
+
+
+audit_handler = create_audit_handler()
+
+
+def setup_audit_logger(name):
+    """Logger writing JSON records through `audit_handler`"""
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.addHandler(audit_handler)
+    return logger
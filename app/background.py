@@ -0,0 +1,62 @@
+import os
+import threading
+
+
+class BackgroundThread:
+    """
+    Daemon thread running `target` in the background of the process that
+    started it. Threads don't survive a fork, so each uWSGI worker starts its
+    own the first time `start` is called in it.
+
+    `target` pauses between rounds of work with `sleep`, which returns True
+    once the thread has to stop.
+    """
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self, setup=None):
+        """
+        Starts the thread unless it runs in this process already, calling
+        `setup` right before when it does
+        """
+        if self.running():
+            return
+
+        with self._lock:
+            if self.running():
+                return
+            if setup is not None:
+                setup()
+            self._stopped.clear()
+            self._wake.clear()
+            self._thread = threading.Thread(
+                target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def running(self):
+        return self._pid == os.getpid() and self._thread.is_alive()
+
+    def wake(self):
+        """Cuts the current or next `sleep` of the thread short"""
+        self._wake.set()
+
+    def sleep(self, timeout):
+        """Waits `timeout` seconds or until woken, returns whether to stop"""
+        self._wake.wait(timeout)
+        self._wake.clear()
+        return self._stopped.is_set()
+
+    def stop(self):
+        """Tells the thread to stop, and waits for it if this process started it"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread and self._pid == os.getpid():
+            self._thread.join()
@@ -0,0 +1,440 @@
+import fcntl
+import glob
+import hashlib
+import mmap
+import os
+# Only the cache file owned by this user is unpickled, see SharedMemoryCache._open
+import pickle  # nosec B403
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask import request
+from prometheus_client import Counter
+
+from app.versioning import LATEST_API_VERSION, VALID_API_VERSIONS
+from configs import Config
+
+cache_requests_counter = Counter(
+    'cache_requests', 'Lookups in the application caches', ['cache', 'result'])
+
+_MISSING = object()
+
+CATALOG_GENERATION = 'catalog'
+COUNTERS_GENERATION = 'counters'
+
+
+class CacheBackend:
+    """Storage of expiring entries and of the generation counters of caches"""
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def update(self, key, function, ttl=None):
+        """Atomically sets `key` to `function(value)` and returns the result"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def counter(self, name):
+        """Current value of the counter `name`, starting at 0"""
+        raise NotImplementedError
+
+    def incr(self, name):
+        """Increments the counter `name` and returns its new value"""
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """Thread safe LRU cache in the memory of a single process"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._get(key, default)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def update(self, key, function, ttl=None):
+        with self._lock:
+            value = function(self._get(key, None))
+            self._set(key, value, ttl)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _get(self, key, default):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key, value, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class SharedMemoryCache(CacheBackend):
+    """Cache in a memory mapped file shared by the processes of the host"""
+    MAGIC = b'RESCACHE'
+    HEADER = struct.Struct('<8sII')
+    COUNTER = struct.Struct('<8sq')
+    MAX_COUNTERS = 64
+    SLOT_HEADER = struct.Struct('<8sdI')
+    DATA_OFFSET = 4096
+
+    def __init__(self, path, slots=512, slot_size=64 * 1024, ttl=None):
+        # Caches laid out differently, like those of workers started before a
+        # configuration change, never map the same file
+        self.path = f'{path}-{slots}x{slot_size}'
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ttl = ttl
+        self._size = self.DATA_OFFSET + slots * slot_size
+        self._thread_lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    @classmethod
+    def attach_all(cls, path):
+        """The caches created for `path`, whatever their layout"""
+        caches = []
+        for name in glob.glob(f'{glob.escape(path)}-*x*'):
+            slots, _, slot_size = name[len(path) + 1:].partition('x')
+            if slots.isdigit() and slot_size.isdigit():
+                caches.append(cls(path, slots=int(slots), slot_size=int(slot_size)))
+        return caches
+
+    def get(self, key, default=None):
+        digest = self._digest(key)
+        with self._locked() as buffer:
+            data = self._read(buffer, digest)
+
+        return self._load(key, data, default)
+
+    def set(self, key, value, ttl=None):
+        data = self._dump(key, value)
+        if data is None:
+            return
+
+        digest = self._digest(key)
+        with self._locked() as buffer:
+            self._write(buffer, digest, data, self._expires_at(ttl))
+
+    def update(self, key, function, ttl=None):
+        digest = self._digest(key)
+        with self._locked() as buffer:
+            value = function(self._load(key, self._read(buffer, digest), None))
+            data = self._dump(key, value)
+            if data is not None:
+                self._write(buffer, digest, data, self._expires_at(ttl))
+            return value
+
+    def delete(self, key):
+        digest = self._digest(key)
+        with self._locked() as buffer:
+            offset = self._slot_offset(digest)
+            if self.SLOT_HEADER.unpack_from(buffer, offset)[0] == digest:
+                self.SLOT_HEADER.pack_into(buffer, offset, b'', 0, 0)
+
+    def clear(self):
+        with self._locked() as buffer:
+            for slot in range(self.slots):
+                offset = self.DATA_OFFSET + slot * self.slot_size
+                self.SLOT_HEADER.pack_into(buffer, offset, b'', 0, 0)
+
+    def counter(self, name):
+        with self._locked() as buffer:
+            offset = self._counter_offset(buffer, self._digest(name))
+            return self.COUNTER.unpack_from(buffer, offset)[1]
+
+    def incr(self, name):
+        digest = self._digest(name)
+        with self._locked() as buffer:
+            offset = self._counter_offset(buffer, digest)
+            value = self.COUNTER.unpack_from(buffer, offset)[1] + 1
+            self.COUNTER.pack_into(buffer, offset, digest, value)
+            return value
+
+    def _read(self, buffer, digest):
+        """Compressed data in the slot of `digest`, None if empty or expired"""
+        offset = self._slot_offset(digest)
+        slot_digest, expires_at, length = self.SLOT_HEADER.unpack_from(buffer, offset)
+        if slot_digest != digest or length == 0:
+            return None
+        if expires_at and expires_at <= time.time():
+            return None
+        start = offset + self.SLOT_HEADER.size
+        return buffer[start:start + length]
+
+    def _write(self, buffer, digest, data, expires_at):
+        offset = self._slot_offset(digest)
+        start = offset + self.SLOT_HEADER.size
+        buffer[start:start + len(data)] = data
+        self.SLOT_HEADER.pack_into(buffer, offset, digest, expires_at, len(data))
+
+    @staticmethod
+    def _load(key, data, default):
+        if data is None:
+            return default
+        # The file can't be written by other users, _open makes sure of it
+        stored_key, value = pickle.loads(zlib.decompress(data))  # nosec B301
+        return value if stored_key == key else default
+
+    def _dump(self, key, value):
+        """Compressed `key` and `value`, None if they don't fit in a slot"""
+        data = zlib.compress(pickle.dumps((key, value), pickle.HIGHEST_PROTOCOL))
+        if len(data) > self.slot_size - self.SLOT_HEADER.size:
+            return None
+        return data
+
+    def _expires_at(self, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        return time.time() + ttl if ttl is not None else 0
+
+    @staticmethod
+    def _digest(key):
+        # hash() is salted per process, so hash the pickled key instead
+        return hashlib.blake2b(pickle.dumps(key, 4), digest_size=8).digest()
+
+    def _slot_offset(self, digest):
+        slot = int.from_bytes(digest, 'little') % self.slots
+        return self.DATA_OFFSET + slot * self.slot_size
+
+    def _counter_offset(self, buffer, digest):
+        for index in range(self.MAX_COUNTERS):
+            offset = self.HEADER.size + index * self.COUNTER.size
+            counter_digest = self.COUNTER.unpack_from(buffer, offset)[0]
+            if counter_digest in (digest, bytes(8)):
+                return offset
+        raise RuntimeError(f"No room for more than {self.MAX_COUNTERS} counters")
+
+    def _locked(self):
+        return _FileLock(self)
+
+    def _open(self):
+        """Maps the file into this process, again after a fork"""
+        if self._pid == os.getpid():
+            return
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        stat = os.fstat(fd)
+        if stat.st_uid != os.geteuid() or stat.st_mode & 0o077:
+            os.close(fd)
+            raise PermissionError(
+                f"{self.path} has to be owned by this user and not be accessible "
+                "to others")
+
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            # Resizing a file mapped by other processes would crash them
+            size = os.fstat(fd).st_size
+            if size == 0:
+                os.ftruncate(fd, self._size)
+            elif size != self._size:
+                raise OSError(f"{self.path} is {size} bytes, not {self._size}")
+            buffer = mmap.mmap(fd, self._size)
+            layout = self.HEADER.pack(self.MAGIC, self.slots, self.slot_size)
+            if buffer[:self.HEADER.size] != layout:
+                # New file
+                buffer[:self.DATA_OFFSET] = bytes(self.DATA_OFFSET)
+                buffer[:self.HEADER.size] = layout
+                for slot in range(self.slots):
+                    offset = self.DATA_OFFSET + slot * self.slot_size
+                    self.SLOT_HEADER.pack_into(buffer, offset, b'', 0, 0)
+        except Exception:
+            # Also releases the lock
+            os.close(fd)
+            raise
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+        self._fd, self._map, self._pid = fd, buffer, os.getpid()
+
+
+class _FileLock:
+    """Holds both the thread lock and the file lock of a SharedMemoryCache"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __enter__(self):
+        self.cache._thread_lock.acquire()
+        try:
+            self.cache._open()
+            fcntl.flock(self.cache._fd, fcntl.LOCK_EX)
+        except Exception:
+            self.cache._thread_lock.release()
+            raise
+        return self.cache._map
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.cache._fd, fcntl.LOCK_UN)
+        self.cache._thread_lock.release()
+
+
+def create_backend(config):
+    if config.CACHE_BACKEND == 'shared':
+        return SharedMemoryCache(
+            config.CACHE_PATH, slots=config.CACHE_SIZE,
+            slot_size=config.CACHE_SLOT_SIZE)
+    return LRUCache(maxsize=config.CACHE_SIZE)
+
+
+backend = create_backend(Config)
+
+
+def workers_backends(config):
+    """The backends shared by the uWSGI workers of this host, also from the CLI"""
+    if config.CACHE_BACKEND == 'shared':
+        return [backend]
+    return SharedMemoryCache.attach_all(config.CACHE_PATH)
+
+
+class Cache:
+    """Named section of the cache backend, dropped when a generation changes"""
+
+    def __init__(self, name, ttl=None, generations=(), backend=None):
+        self.name = name
+        self.ttl = ttl
+        self.generations = (name,) + tuple(generations)
+        self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend if self._backend is not None else backend
+
+    def get(self, key, default=None, generation=None):
+        value = self.backend.get(self._key(key, generation), _MISSING)
+
+        result = 'miss' if value is _MISSING else 'hit'
+        cache_requests_counter.labels(cache=self.name, result=result).inc()
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Stores `value`, unless the cache was cleared since `generation`"""
+        if generation is not None and generation != self.generation():
+            return
+        self.backend.set(
+            self._key(key, generation), value, self.ttl if ttl is None else ttl)
+
+    def update(self, key, function, ttl=None):
+        return self.backend.update(
+            self._key(key), function, self.ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        self.backend.delete(self._key(key))
+
+    def clear(self):
+        self.backend.incr(self.name)
+
+    def clear_workers(self):
+        """Clears the entries of the uWSGI workers, from outside of them"""
+        for shared in workers_backends(Config):
+            if shared is not self.backend:
+                shared.incr(self.name)
+
+    def generation(self):
+        """Changes whenever the entries of the cache are dropped"""
+        return tuple(self.backend.counter(name) for name in self.generations)
+
+    def _key(self, key, generation=None):
+        if generation is None:
+            generation = self.generation()
+        return (self.name, generation, key)
+
+
+# Total row counts of paginated listings, keyed by their normalized filters
+count_cache = Cache(
+    'count', ttl=Config.COUNT_CACHE_TTL, generations=[CATALOG_GENERATION])
+
+# Payloads of the read only endpoints, keyed by `response_cache_key`. They are
+# stored as an anonymous caller would see them, without any user_vote_direction
+response_cache = Cache(
+    'response', ttl=Config.RESPONSE_CACHE_TTL,
+    generations=[CATALOG_GENERATION, COUNTERS_GENERATION])
+
+
+# Version of the whole catalog, see `catalog_version` in the routes' helpers
+catalog_version_cache = Cache(
+    'catalog-version', ttl=Config.RESPONSE_CACHE_TTL,
+    generations=[CATALOG_GENERATION, COUNTERS_GENERATION])
+
+# Search answers by `search_cache_key`, see `cached_search` in app.search.
+# Votes and clicks don't drop them, only writes to the search index do
+search_cache = Cache('search')
+
+# API keys by apikey and by email, see `find_key_by_apikey` in app.api.auth
+auth_cache = Cache('auth', ttl=Config.AUTH_CACHE_TTL)
+
+# Claims of verified JWTs by token digest, see `jwt_to_key` in app.api.auth.
+# Kept in the memory of each process, so no other process can add tokens
+jwt_cache = Cache('jwt', backend=LRUCache(maxsize=Config.JWT_CACHE_SIZE))
+
+
+def response_cache_key():
+    """Identifies the payload of the current request in the response cache"""
+    version = request.headers.get('x-api-version', LATEST_API_VERSION)
+    if version not in VALID_API_VERSIONS:
+        version = LATEST_API_VERSION
+
+    args = tuple(sorted(request.args.items(multi=True)))
+    return (request.path, args, version)
+
+
+def invalidate_catalog():
+    """Drops everything cached about resources, call after writing to them"""
+    backend.incr(CATALOG_GENERATION)
+
+
+def invalidate_counters():
+    """Drops the cached responses after clicks, which don't change any count"""
+    backend.incr(COUNTERS_GENERATION)
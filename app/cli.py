@@ -1,17 +1,20 @@
 import os
 import time
+from datetime import timezone
 
 import yaml
 import requests
 from concurrent.futures import ThreadPoolExecutor
 
 import click
-from app import index, search_client
+from app import search_client
 from app.api.auth import (ApiKeyError, deny_key,
                           find_key_by_apikey_or_email, rotate_key)
 from sqlalchemy import exc
 
-from .models import Category, Language, Resource
+from .models import Category, IndexOutbox, Language, Resource
+from .outbox import drain_outbox
+from .search import rebuild_index, search_backends, sync_index
 
 
 def import_resources(db):   # pragma: no cover
@@ -131,13 +134,14 @@ def update_resource(resource, existing_resource):   # pragma: no cover
     existing_resource.languages = resource['languages']
 
 
-def reindex_all():  # pragma: no cover
-    query = Resource.query
+def reindex_all(batch_size):  # pragma: no cover
     indicies = search_client.list_indices()
     for ind in indicies['items']:
         if ind['name'] == os.environ.get('INDEX_NAME'):
-            db_list = [u.serialize_algolia_search for u in query.all()]
-            index.replace_all_objects(db_list)
+            def progress(done, total):
+                print(f"Indexed {done}/{total} resources", flush=True)
+
+            rebuild_index(search_backends['algolia'], batch_size, progress)
     print("Finished Reindexing.")
 
 
@@ -202,8 +206,32 @@ def register(app, db):  # pragma: no cover
         db.create_all()
 
     @algolia.command()
-    def reindex():
-        reindex_all()
+    @click.option('--batch-size', type=int, default=500,
+                  help='Resources read from the database at a time')
+    def reindex(batch_size):
+        """Replace the whole index with the resources of the database"""
+        reindex_all(batch_size)
+
+    @algolia.command()
+    @click.option('--since', type=click.DateTime(), default=None,
+                  help='Sync the resources changed since then (UTC) rather than '
+                       'since the last sync')
+    @click.option('--batch-size', type=int, default=500,
+                  help='Resources written to the index per request')
+    def sync(since, batch_size):
+        """Index the resources changed since the last sync"""
+        if since is not None:
+            since = since.replace(tzinfo=timezone.utc)
+        saved, deleted = sync_index(search_backends['algolia'], since, batch_size)
+        print(f"Indexed {saved} resources, removed {deleted}.")
+
+    @algolia.command()
+    @click.option('--batch-size', type=int, default=None,
+                  help='Resources written to the index per request')
+    def drain(batch_size):
+        """Index the resources waiting in the outbox"""
+        done = drain_outbox(batch_size)
+        print(f"Indexed {done} outbox entries, {IndexOutbox.query.count()} left.")
 
     @apikey.command()
     @click.argument('apikey_or_email')
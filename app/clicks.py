@@ -0,0 +1,93 @@
+import atexit
+import threading
+from collections import Counter
+
+from sqlalchemy import bindparam, func
+
+from app import db
+from app.background import BackgroundThread
+from app.cache import invalidate_counters
+from app.models import Resource
+from app.utils import setup_logger
+
+logger = setup_logger('clicks_logger')
+
+
+class ClickBuffer:
+    """
+    Counts clicks on resources in memory and adds them to `times_clicked` in
+    one batch every CLICK_FLUSH_INTERVAL seconds, from a background thread of
+    the process, and once more when the process exits. The increments happen
+    in SQL, so concurrent flushes from several workers never lose clicks.
+
+    With a CLICK_FLUSH_INTERVAL of 0 every click is written right away.
+    """
+
+    def __init__(self):
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._app = None
+        self._thread = BackgroundThread('click-buffer', self._run)
+        atexit.register(self.stop)
+
+    def add(self, resource_id, app):
+        with self._lock:
+            self._pending[resource_id] += 1
+
+        if app.config['CLICK_FLUSH_INTERVAL'] <= 0:
+            self.flush()
+        else:
+            self._app = app
+            self._thread.start()
+
+    def pending(self, resource_id):
+        """Clicks on the resource that haven't been written yet"""
+        with self._lock:
+            return self._pending[resource_id]
+
+    def flush(self):
+        """Writes the pending clicks, returns the number of resources updated"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+
+        statement = Resource.__table__.update().where(
+            Resource.id == bindparam('resource_id')
+        ).values(
+            times_clicked=func.coalesce(Resource.times_clicked, 0) + bindparam('clicks')
+        )
+        try:
+            db.session.execute(statement, [
+                {'resource_id': resource_id, 'clicks': clicks}
+                for resource_id, clicks in pending.items()
+            ])
+            db.session.commit()
+        except Exception as e:
+            logger.exception(e)
+            db.session.rollback()
+            # Keep the clicks for the next flush
+            with self._lock:
+                self._pending.update(pending)
+            return 0
+
+        invalidate_counters()
+        return len(pending)
+
+    def stop(self):
+        """Stops the background thread and writes the remaining clicks"""
+        self._thread.stop()
+        if self._app:
+            with self._app.app_context():
+                self.flush()
+
+    def _run(self):
+        while not self._thread.sleep(self._app.config['CLICK_FLUSH_INTERVAL']):
+            with self._app.app_context():
+                try:
+                    self.flush()
+                finally:
+                    db.session.remove()
+
+
+click_buffer = ClickBuffer()
@@ -1,8 +1,12 @@
 from app import db
-from sqlalchemy import DateTime
+from sqlalchemy import DateTime, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
 from sqlalchemy_utils import URLType
 
+# Text search configuration used to build and query Resource.search_vector
+SEARCH_CONFIG = 'english'
+
 language_identifier = db.Table('language_identifier',
                                db.Column(
                                    'resource_id',
@@ -11,7 +15,8 @@ language_identifier = db.Table('language_identifier',
                                db.Column(
                                    'language_id',
                                    db.Integer,
-                                   db.ForeignKey('language.id'))
+                                   db.ForeignKey('language.id'),
+                                   index=True)
                                )
 
 
@@ -26,7 +31,8 @@ class Resource(TimestampMixin, db.Model):
     url = db.Column(URLType, nullable=False, unique=True)
     category_id = db.Column(db.Integer,
                             db.ForeignKey('category.id'),
-                            nullable=False)
+                            nullable=False,
+                            index=True)
     category = db.relationship('Category')
     languages = db.relationship('Language', secondary=language_identifier)
     free = db.Column(db.Boolean, nullable=False, default=True)
@@ -35,9 +41,23 @@ class Resource(TimestampMixin, db.Model):
     downvotes = db.Column(db.INTEGER, default=0)
     times_clicked = db.Column(db.INTEGER, default=0)
     voters = db.relationship('VoteInformation', back_populates='resource')
-
-    def serialize(self, apikey=None):
-        """Return object data in easily serializeable format"""
+    # Words the resource is found by when searching the database, kept up to
+    # date by `update_search_vector`. Plain lowercase text outside Postgres.
+    # Only loaded when accessed, and not part of the API
+    search_vector = db.deferred(db.Column(
+        db.Text().with_variant(TSVECTOR(), 'postgresql'), info={'internal': True}))
+
+    __table_args__ = (
+        db.Index('ix_resource_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
+    def serialize(self, apikey=None, vote_directions=None):
+        """Return object data in easily serializeable format
+
+        apikey -- the caller's key, used to look up their vote on this resource
+        vote_directions -- optional {resource_id: direction} map of the caller's
+        votes, saves the lookup when it was already fetched for many resources
+        """
         if self.created_at:
             created = self.created_at.strftime("%Y-%m-%d %H:%M:%S")
         else:
@@ -47,6 +67,16 @@ class Resource(TimestampMixin, db.Model):
         else:
             updated = ""
 
+        if vote_directions is not None:
+            user_vote_direction = vote_directions.get(self.id)
+        elif apikey and self.id is not None:
+            # Primary key lookup of the one vote, rather than loading every voter
+            vote = VoteInformation.query.get(
+                {'voter_apikey': apikey, 'resource_id': self.id})
+            user_vote_direction = vote.current_direction if vote else None
+        else:
+            user_vote_direction = None
+
         return {
             'id': self.id,
             'name': self.name,
@@ -60,10 +90,7 @@ class Resource(TimestampMixin, db.Model):
             'times_clicked': self.times_clicked,
             'created_at': created,
             'last_updated': updated,
-            'user_vote_direction': next(
-                (voter.current_direction for voter in self.voters
-                 if voter.voter_apikey == apikey), None
-            ) if apikey else None
+            'user_vote_direction': user_vote_direction
         }
 
     @property
@@ -106,6 +133,24 @@ class Resource(TimestampMixin, db.Model):
                 f"\tURL: {self.url}\n>")
 
 
+@event.listens_for(Resource, 'before_insert')
+@event.listens_for(Resource, 'before_update')
+def update_search_vector(mapper, connection, resource):
+    """Indexes the name, then the notes, category and languages of the resource"""
+    name = str(resource.name or '')
+    details = [resource.notes, resource.category.name if resource.category else None]
+    details += resource.serialize_languages
+    # The API accepts numbers for text fields
+    details = ' '.join(str(detail) for detail in details if detail)
+
+    if connection.dialect.name == 'postgresql':
+        resource.search_vector = func.setweight(
+            func.to_tsvector(SEARCH_CONFIG, name), 'A'
+        ).op('||')(func.setweight(func.to_tsvector(SEARCH_CONFIG, details), 'B'))
+    else:
+        resource.search_vector = f"{name} {details}".lower()
+
+
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -206,3 +251,34 @@ class VoteInformation(db.Model):
     current_direction = db.Column(db.String, nullable=True)
     resource = db.relationship('Resource', back_populates='voters')
     voter = db.relationship('Key', back_populates='voted_resources')
+
+
+class IndexOutbox(db.Model):
+    """
+    Resource waiting to be written to the search index, see app.outbox. Rows
+    are added in the same transaction as the changes to their resource, so
+    no change can be committed without being indexed later.
+    """
+    __tablename__ = 'index_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key, the row outlives the resource when it's deleted
+    resource_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(DateTime(timezone=True), server_default=func.now())
+    # Failed attempts to write the resource, the next one waiting until
+    # next_attempt_at
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(DateTime(timezone=True), nullable=True, index=True)
+    last_error = db.Column(db.String)
+
+    def __repr__(self):
+        return f"<IndexOutbox resource_id={self.resource_id} attempts={self.attempts}>"
+
+
+class IndexSyncState(db.Model):
+    """Start of the last `flask algolia sync` of a search index"""
+    __tablename__ = 'index_sync_state'
+    name = db.Column(db.String, primary_key=True)
+    synced_at = db.Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<IndexSyncState {self.name} synced_at={self.synced_at}>"
@@ -0,0 +1,170 @@
+import atexit
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from prometheus_client import Counter
+from sqlalchemy import or_, text
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import db
+from app.background import BackgroundThread
+from app.models import IndexOutbox, Resource
+from app.search import clear_search_cache, search_backend
+from app.utils import setup_logger
+
+logger = setup_logger('outbox_logger')
+
+# First key of the advisory locks taken on resources while draining the outbox
+RESOURCE_LOCK_NAMESPACE = 0x1DE0
+
+index_writes_counter = Counter(
+    'index_outbox_writes', 'Resources written to the search index from the outbox',
+    ['result'])
+
+
+def enqueue_index_writes(resources):
+    """
+    Records in the session that `resources` have to be written to the search
+    index, with a single INSERT. Call before committing the changes to the
+    resources, so both are committed together.
+    """
+    if any(resource.id is None for resource in resources):
+        db.session.flush()
+    db.session.execute(IndexOutbox.__table__.insert(), [
+        {'resource_id': resource.id} for resource in resources])
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the `attempts`th failed attempt, doubling each time"""
+    config = current_app.config
+    return min(config['INDEX_OUTBOX_MAX_RETRY_DELAY'],
+               config['INDEX_OUTBOX_RETRY_DELAY'] * 2 ** (attempts - 1))
+
+
+def lock_resources(resource_ids):
+    """
+    Makes the drains of other workers wait for this transaction to end before
+    reading any of the resources, with advisory locks that don't keep writers
+    waiting. Postgres only.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+
+    # Always locked in the same order, so two drains can't wait on each other
+    db.session.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, id) FROM ("
+             "SELECT unnest(CAST(:ids AS integer[])) AS id ORDER BY id) AS ids"),
+        {'namespace': RESOURCE_LOCK_NAMESPACE, 'ids': sorted(resource_ids)})
+
+
+def drain_outbox(batch_size=None):
+    """
+    Writes the resources waiting in the outbox to the search index, in
+    batches of `batch_size`, and returns how many outbox rows were done.
+
+    A batch that fails stays in the outbox, and is tried again after a delay
+    growing with each attempt. The resources are written as they are when
+    the batch is read, so a resource changed many times is written once, and
+    the ones deleted since are removed from the index.
+    """
+    if batch_size is None:
+        batch_size = current_app.config['INDEX_OUTBOX_BATCH_SIZE']
+    done = 0
+
+    while True:
+        now = datetime.now(timezone.utc)
+        # Rows locked by another worker draining the outbox are left to it
+        entries = IndexOutbox.query.filter(or_(
+            IndexOutbox.next_attempt_at.is_(None),
+            IndexOutbox.next_attempt_at <= now,
+        )).order_by(IndexOutbox.id).limit(batch_size) \
+            .with_for_update(skip_locked=True).all()
+        if not entries:
+            break
+
+        # Rows of the same resource can be locked by another worker. Reading
+        # the resource once it's done with it means the newest state is always
+        # written last
+        resource_ids = {entry.resource_id for entry in entries}
+        lock_resources(resource_ids)
+        resources = Resource.query.options(
+            joinedload(Resource.category), selectinload(Resource.languages)
+        ).filter(Resource.id.in_(resource_ids)).all()
+        deleted = sorted(resource_ids - {resource.id for resource in resources})
+
+        try:
+            search_backend().save_objects(
+                [resource.serialize_algolia_search for resource in resources])
+            if deleted:
+                search_backend().delete_objects(deleted)
+
+        except Exception as e:
+            logger.exception(e)
+            for entry in entries:
+                entry.attempts += 1
+                entry.next_attempt_at = now + timedelta(
+                    seconds=retry_delay(entry.attempts))
+                entry.last_error = str(e)
+            db.session.commit()
+            index_writes_counter.labels(result='failed').inc(len(resource_ids))
+            break
+
+        IndexOutbox.query.filter(
+            IndexOutbox.id.in_([entry.id for entry in entries])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        index_writes_counter.labels(result='written').inc(len(resource_ids))
+        done += len(entries)
+
+        if len(entries) < batch_size:
+            break
+
+    if done:
+        clear_search_cache()
+    return done
+
+
+class OutboxWorker:
+    """
+    Drains the outbox from a background thread of the process, right after
+    requests added to it and every INDEX_OUTBOX_INTERVAL seconds, which
+    retries the failed writes and picks up the rows other processes left.
+
+    With an INDEX_OUTBOX_INTERVAL of 0 the outbox is drained in the request.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._thread = BackgroundThread('index-outbox', self._run)
+        atexit.register(self.stop)
+
+    def notify(self, app):
+        """Tells the worker rows were added to the outbox"""
+        if app.config['INDEX_OUTBOX_INTERVAL'] <= 0:
+            try:
+                drain_outbox()
+            except Exception as e:
+                logger.exception(e)
+                db.session.rollback()
+        else:
+            self._app = app
+            self._thread.start()
+            self._thread.wake()
+
+    def stop(self):
+        """Stops the background thread, the rows left are drained later"""
+        self._thread.stop()
+
+    def _run(self):
+        while not self._thread.sleep(self._app.config['INDEX_OUTBOX_INTERVAL']):
+            with self._app.app_context():
+                try:
+                    drain_outbox()
+                except Exception as e:
+                    logger.exception(e)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,540 @@
+import bisect
+import math
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import db, index
+from app.cache import search_cache
+from app.models import SEARCH_CONFIG, Category, IndexSyncState, Language, Resource
+from app.utils import setup_logger
+
+logger = setup_logger('search_logger')
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Seconds after which a background refresh that didn't store its answer is
+# considered failed, and another one may start
+REFRESH_TIMEOUT = 30
+
+# Attributes of the resources matched against the search words, with the
+# weight of a match in each of them
+SEARCHABLE_ATTRIBUTES = (('name', 2), ('category', 1), ('languages', 1), ('notes', 1))
+
+
+def tokenize(text):
+    """Lowercase words of `text`"""
+    return TOKEN_PATTERN.findall(str(text).lower()) if text is not None else []
+
+
+def empty_answer(page, page_size):
+    return {'hits': [], 'page': page, 'nbPages': 0, 'hitsPerPage': page_size,
+            'nbHits': 0}
+
+
+class SearchBackend:
+    """Search engine behind /search, answering like Algolia does"""
+
+    def search(self, term, free=None, category=None, languages=(), page=0,
+               page_size=20):
+        raise NotImplementedError
+
+    def save_objects(self, objects):
+        """Adds the resources, replacing the ones with the same objectID"""
+        raise NotImplementedError
+
+    def partial_update_object(self, obj):
+        """Updates the attributes given in `obj` of the resource obj['objectID']"""
+        raise NotImplementedError
+
+    def replace_all_objects(self, objects):
+        """Replaces every resource of the backend with `objects`, maybe an iterator"""
+        raise NotImplementedError
+
+    def delete_objects(self, object_ids):
+        """Removes the resources with these objectIDs"""
+        raise NotImplementedError
+
+    def object_ids(self):
+        """objectIDs of every resource in the backend"""
+        raise NotImplementedError
+
+
+class AlgoliaBackend(SearchBackend):
+    """Searches the Algolia index `index`"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def search(self, term, free=None, category=None, languages=(), page=0,
+               page_size=20):
+        filters = []
+
+        # algolia filters boolean attributes with either 0 or 1
+        if free is not None:
+            filters.append(f'free={int(free)}')
+
+        if category:
+            # to not let double quotes conflict with algolia filter format
+            category = category.replace('"', "'")
+            filters.append(f'category: "{category}"')
+
+        if languages:
+            # joining all possible language values to algolia filter query
+            languages = ['languages:"{}"'.format(language.replace('"', "'"))
+                         for language in languages]
+            filters.append(f"( {' OR '.join(languages)} )")
+
+        return self.index.search(f'{term}', {
+            'filters': " AND ".join(filters),
+            'page': page,
+            'hitsPerPage': page_size
+        })
+
+    def save_objects(self, objects):
+        self.index.save_objects(objects)
+
+    def partial_update_object(self, obj):
+        self.index.partial_update_object(obj)
+
+    def replace_all_objects(self, objects):
+        self.index.replace_all_objects(objects)
+
+    def delete_objects(self, object_ids):
+        self.index.delete_objects(object_ids)
+
+    def object_ids(self):
+        # Algolia stores the objectIDs as strings
+        return [int(hit['objectID']) for hit in self.index.browse_objects(
+            {'attributesToRetrieve': ['objectID']})]
+
+
+class DatabaseBackend(SearchBackend):
+    """Searches the resources with the full text search of the database"""
+
+    def search(self, term, free=None, category=None, languages=(), page=0,
+               page_size=20):
+        if page < 0 or page_size < 1:
+            return empty_answer(page, page_size)
+
+        query = Resource.query.options(
+            joinedload(Resource.category), selectinload(Resource.languages))
+
+        if free is not None:
+            query = query.filter(Resource.free == free)
+
+        if category:
+            query = query.filter(Resource.category.has(
+                func.lower(Category.name) == category.lower()))
+
+        if languages:
+            query = query.filter(Resource.languages.any(
+                func.lower(Language.name).in_(
+                    [language.lower() for language in languages])))
+
+        order = [Resource.id]
+        if term.strip():
+            if db.engine.dialect.name == 'postgresql':
+                ts_query = func.plainto_tsquery(SEARCH_CONFIG, term)
+                query = query.filter(Resource.search_vector.op('@@')(ts_query))
+                order.insert(0, func.ts_rank(Resource.search_vector, ts_query).desc())
+            else:
+                for word in term.lower().split():
+                    query = query.filter(
+                        Resource.search_vector.contains(word, autoescape=True))
+
+        total_count = query.order_by(None).count()
+        resources = query.order_by(*order) \
+            .offset(page * page_size).limit(page_size).all()
+
+        return {
+            'hits': [resource.serialize(vote_directions={}) for resource in resources],
+            'page': page,
+            'nbPages': math.ceil(total_count / page_size),
+            'hitsPerPage': page_size,
+            'nbHits': total_count,
+        }
+
+    def save_objects(self, objects):
+        pass
+
+    def partial_update_object(self, obj):
+        pass
+
+    def replace_all_objects(self, objects):
+        pass
+
+    def delete_objects(self, object_ids):
+        pass
+
+    def object_ids(self):
+        return [id for id, in db.session.query(Resource.id)]
+
+
+class InMemoryBackend(SearchBackend):
+    """Inverted index of the resources in the memory of the process"""
+
+    def __init__(self, sync=None, version=None):
+        # sync(backend, since) writes the resources changed since `since` to the
+        # backend, all of them when None, and returns what `since` is next time
+        self.sync = sync
+        self.version = version
+        self._version = None
+        self._synced_at = None
+        self._objects = {}
+        # token -> {objectID: weight of the best attribute containing it}
+        self._postings = defaultdict(dict)
+        # (attribute, value) -> objectIDs
+        self._facets = defaultdict(set)
+        # Sorted tokens for the prefix lookups, None until the next search
+        # when the vocabulary changed
+        self._tokens = None
+        self._lock = threading.RLock()
+
+    def search(self, term, free=None, category=None, languages=(), page=0,
+               page_size=20):
+        if page < 0 or page_size < 1:
+            return empty_answer(page, page_size)
+
+        with self._lock:
+            self._refresh()
+
+            scores = self._match(tokenize(term))
+
+            if free is not None:
+                scores = self._filter(scores, self._facets.get(('free', free), ()))
+            if category:
+                scores = self._filter(
+                    scores, self._facets.get(('category', category.lower()), ()))
+            if languages:
+                matching = set()
+                for language in languages:
+                    matching |= self._facets.get(
+                        ('languages', language.lower()), set())
+                scores = self._filter(scores, matching)
+
+            ranked = sorted(
+                scores, key=lambda object_id: (-scores[object_id], object_id))
+            start = page * page_size
+            hits = [dict(self._objects[object_id])
+                    for object_id in ranked[start:start + page_size]]
+
+        return {
+            'hits': hits,
+            'page': page,
+            'nbPages': math.ceil(len(ranked) / page_size),
+            'hitsPerPage': page_size,
+            'nbHits': len(ranked),
+        }
+
+    def save_objects(self, objects):
+        with self._lock:
+            for obj in objects:
+                self._remove(obj['objectID'])
+                self._add(obj)
+
+    def partial_update_object(self, obj):
+        with self._lock:
+            updated = {**self._objects.get(obj['objectID'], {}), **obj}
+            self._remove(obj['objectID'])
+            self._add(updated)
+
+    def replace_all_objects(self, objects):
+        with self._lock:
+            self._objects.clear()
+            self._postings.clear()
+            self._facets.clear()
+            self._tokens = None
+            for obj in objects:
+                self._add(obj)
+
+    def delete_objects(self, object_ids):
+        with self._lock:
+            for object_id in object_ids:
+                self._remove(object_id)
+
+    def object_ids(self):
+        with self._lock:
+            return list(self._objects)
+
+    def _refresh(self):
+        if self.version is None:
+            return
+        version = self.version()
+        if version != self._version:
+            self._synced_at = self.sync(self, self._synced_at)
+            self._version = version
+
+    def _match(self, words):
+        """{objectID: score} of the resources matching every word"""
+        if not words:
+            return dict.fromkeys(self._objects, 0)
+
+        scores = None
+        for position, word in enumerate(words):
+            if position == len(words) - 1:
+                tokens = self._prefixed(word)
+            else:
+                tokens = [word] if word in self._postings else []
+
+            word_scores = {}
+            for token in tokens:
+                for object_id, weight in self._postings[token].items():
+                    word_scores[object_id] = max(word_scores.get(object_id, 0), weight)
+
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {object_id: scores[object_id] + weight
+                          for object_id, weight in word_scores.items()
+                          if object_id in scores}
+            if not scores:
+                break
+        return scores
+
+    @staticmethod
+    def _filter(scores, object_ids):
+        return {object_id: score for object_id, score in scores.items()
+                if object_id in object_ids}
+
+    def _prefixed(self, prefix):
+        """Tokens starting with `prefix`"""
+        if self._tokens is None:
+            self._tokens = sorted(self._postings)
+        tokens = []
+        for token in self._tokens[bisect.bisect_left(self._tokens, prefix):]:
+            if not token.startswith(prefix):
+                break
+            tokens.append(token)
+        return tokens
+
+    def _entries(self, obj):
+        """(token, weight) pairs and facet keys of `obj`"""
+        tokens = {}
+        for attribute, weight in SEARCHABLE_ATTRIBUTES:
+            values = obj.get(attribute)
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                for token in tokenize(value):
+                    tokens[token] = max(tokens.get(token, 0), weight)
+
+        facets = [('free', bool(obj.get('free')))]
+        if obj.get('category') is not None:
+            facets.append(('category', str(obj['category']).lower()))
+        facets.extend(('languages', str(language).lower())
+                      for language in obj.get('languages') or ())
+        return tokens, facets
+
+    def _add(self, obj):
+        object_id = obj['objectID']
+        self._objects[object_id] = dict(obj)
+        tokens, facets = self._entries(obj)
+        for token, weight in tokens.items():
+            if token not in self._postings:
+                self._tokens = None
+            self._postings[token][object_id] = weight
+        for facet in facets:
+            self._facets[facet].add(object_id)
+
+    def _remove(self, object_id):
+        obj = self._objects.pop(object_id, None)
+        if obj is None:
+            return
+        tokens, facets = self._entries(obj)
+        for token in tokens:
+            postings = self._postings[token]
+            postings.pop(object_id, None)
+            if not postings:
+                del self._postings[token]
+                self._tokens = None
+        for facet in facets:
+            self._facets[facet].discard(object_id)
+
+
+def resource_batches(query, batch_size):
+    """Lists of at most `batch_size` resources of `query`, by increasing id"""
+    query = query.options(
+        joinedload(Resource.category), selectinload(Resource.languages)
+    ).order_by(Resource.id)
+    last_id = None
+    while True:
+        batch_query = query if last_id is None else query.filter(Resource.id > last_id)
+        batch = batch_query.limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def rebuild_index(backend, batch_size=500, progress=None):
+    """Replaces every resource of `backend` with the ones of the database"""
+    total = Resource.query.count()
+
+    def objects():
+        done = 0
+        for batch in resource_batches(Resource.query, batch_size):
+            for resource in batch:
+                yield resource.serialize_algolia_search
+            done += len(batch)
+            if progress:
+                progress(done, total)
+
+    backend.replace_all_objects(objects())
+    clear_search_cache()
+
+
+def sync_index(backend, since=None, batch_size=500, name='algolia'):
+    """Writes the resources changed since the previous sync to `backend`"""
+    started_at = db.session.query(func.now()).scalar()
+    state = IndexSyncState.query.get(name)
+    if since is None and state is not None:
+        since = state.synced_at - timedelta(
+            seconds=current_app.config['INDEX_SYNC_OVERLAP'])
+
+    saved, deleted = write_changes(backend, since, batch_size)
+
+    if state is None:
+        state = IndexSyncState(name=name)
+        db.session.add(state)
+    state.synced_at = started_at
+    db.session.commit()
+
+    if saved or deleted:
+        clear_search_cache()
+    return saved, deleted
+
+
+def write_changes(backend, since=None, batch_size=500):
+    """Writes the resources changed since `since` to `backend`, removes the others"""
+    query = Resource.query
+    if since is not None:
+        query = query.filter(
+            func.coalesce(Resource.last_updated, Resource.created_at) >= since)
+
+    saved = 0
+    for batch in resource_batches(query, batch_size):
+        backend.save_objects([resource.serialize_algolia_search for resource in batch])
+        saved += len(batch)
+
+    deleted = sorted(set(backend.object_ids()) - {
+        id for id, in db.session.query(Resource.id)})
+    for start in range(0, len(deleted), batch_size):
+        backend.delete_objects(deleted[start:start + batch_size])
+    return saved, len(deleted)
+
+
+def sync_memory_index(backend, since=None):
+    """Writes the resources changed since `since` to the in-memory `backend`"""
+    started_at = db.session.query(func.now()).scalar()
+    if since is not None:
+        since -= timedelta(seconds=current_app.config['INDEX_SYNC_OVERLAP'])
+    write_changes(backend, since)
+    return started_at
+
+
+search_backends = {
+    'algolia': AlgoliaBackend(index),
+    'database': DatabaseBackend(),
+    # Synced after the writes to the index that clear the search cache, not
+    # after every vote and click that changes the catalog
+    'memory': InMemoryBackend(sync=sync_memory_index, version=search_cache.generation),
+}
+
+
+def search_backend():
+    """The backend picked by the SEARCH_BACKEND setting"""
+    return search_backends[current_app.config['SEARCH_BACKEND']]
+
+
+def search_cache_key(term, free=None, category=None, languages=(), page=0,
+                     page_size=20):
+    """Identifies a search in `search_cache`, whatever the case and order used"""
+    return (
+        current_app.config['SEARCH_BACKEND'],
+        ' '.join(term.lower().split()),
+        free,
+        category.lower() if category else None,
+        tuple(sorted({language.lower() for language in languages})),
+        page,
+        page_size,
+    )
+
+
+def clear_search_cache():
+    """Drops the cached answers, also those of the workers when run from the CLI"""
+    search_cache.clear()
+    search_cache.clear_workers()
+
+
+def cached_search(term, **params):
+    """Searches with `search_backend()`, through `search_cache`"""
+    config = current_app.config
+    if config['SEARCH_CACHE_TTL'] <= 0:
+        return search_backend().search(term, **params)
+
+    key = search_cache_key(term, **params)
+    generation = search_cache.generation()
+    entry = search_cache.get(key, generation=generation)
+    if entry is None:
+        answer = search_backend().search(term, **params)
+        store_search(key, answer, generation)
+        return answer
+
+    answer, fresh_until, _ = entry
+    if fresh_until <= time.time():
+        refresh = claim_refresh(key)
+        if refresh:
+            threading.Thread(
+                target=refresh_search, daemon=True,
+                args=(current_app._get_current_object(), key, term, params),
+                name='search-refresh').start()
+    return answer
+
+
+def store_search(key, answer, generation):
+    config = current_app.config
+    fresh_until = time.time() + config['SEARCH_CACHE_TTL']
+    search_cache.set(key, (answer, fresh_until, None),
+                     ttl=config['SEARCH_CACHE_TTL'] + config['SEARCH_CACHE_STALE_TTL'],
+                     generation=generation)
+
+
+def claim_refresh(key):
+    """Returns whether the caller gets to refresh the stale entry of `key`"""
+    token = uuid.uuid4().hex
+    now = time.time()
+
+    def claim(entry):
+        if entry is None:
+            return None
+        answer, fresh_until, refresh = entry
+        if refresh is None or refresh[1] + REFRESH_TIMEOUT <= now:
+            return (answer, fresh_until, (token, now))
+        return entry
+
+    # Stale entries have less than SEARCH_CACHE_STALE_TTL seconds left, which
+    # is long enough for the refresh to replace them
+    entry = search_cache.update(
+        key, claim, ttl=current_app.config['SEARCH_CACHE_STALE_TTL'])
+    return entry is not None and entry[2] is not None and entry[2][0] == token
+
+
+def refresh_search(app, key, term, params):
+    with app.app_context():
+        generation = search_cache.generation()
+        try:
+            answer = search_backends[key[0]].search(term, **params)
+        except Exception as e:
+            # The stale answer stays, until another refresh once this one
+            # timed out
+            logger.exception(e)
+            return
+        store_search(key, answer, generation)
@@ -1,10 +1,15 @@
+import base64
+import json
 import logging
 import random
 import string
 import sys
 
+from .cache import count_cache
 from .versioning import LATEST_API_VERSION, versioned
 from flask import jsonify
+from flask_sqlalchemy import Pagination
+from sqlalchemy import and_, or_
 
 err_map = {
     400: "Bad Request",
@@ -14,7 +19,8 @@ err_map = {
     405: "Method Not Allowed",
     422: "Unprocessable Entity",
     429: "Rate Limit Exceeded",
-    500: "Server Error"
+    500: "Server Error",
+    503: "Service Unavailable"
 }
 
 msg_map = {
@@ -25,28 +31,160 @@ msg_map = {
     405: "This method is not allowed.",
     422: "This request failed validation",
     429: "You have exceeded your rate limit. Try again later.",
-    500: "Something went wrong"
+    500: "Something went wrong",
+    503: "A service this request depends on is unavailable. Try again later."
 }
 
 
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class UncountedPage:
+    """A page of results fetched without counting the rows of the whole query"""
+    total = None
+    pages = None
+
+    def __init__(self, page, per_page, items, has_next):
+        self.page = page
+        self.per_page = per_page
+        self.items = items
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+
+class CursorPage:
+    def __init__(self, items, per_page, next_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.has_next = next_cursor is not None
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """The `length` int values of the sort columns encoded in `cursor`"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor(cursor)
+    # Anything else would reach the database, which rejects comparing ids to it
+    if not all(type(value) is int for value in values):
+        raise InvalidCursor(cursor)
+    return values
+
+
 class Paginator:
     def __init__(self, configuration, request):
         self.configuration = configuration
 
         self.page = request.args.get('page', 1, type=int)
         self.page_size = request.args.get('page_size', configuration.per_page, type=int)
+        # An empty `cursor=` asks for the first page in cursor mode
+        self.cursor = request.args.get('cursor')
+        # How to fill in total_count: None uses the cached count when there is one
+        self.count = request.args.get('count', type=str.lower)
+        if self.count not in COUNT_MODES:
+            self.count = None
 
         if self.page_size > configuration.max_page_size:
             self.page_size = configuration.max_page_size
+        if self.page_size < 1:
+            self.page_size = configuration.per_page
+        if self.page < 1:
+            self.page = 1
+
+    @property
+    def uses_cursor(self):
+        return self.cursor is not None
+
+    def cursor_data(self, query, sort_columns):
+        """
+        Keyset pagination: returns the page of `query` that follows the
+        request's cursor when ordered by `sort_columns`, which must be unique
+        together. Unlike `paginated_data` this never counts the rows or skips
+        over earlier pages, so every page costs the same.
+        """
+        query = query.add_columns(*sort_columns).order_by(*sort_columns)
+
+        if self.cursor:
+            values = decode_cursor(self.cursor, len(sort_columns))
+            query = query.filter(keyset_after(sort_columns, values))
 
-    def paginated_data(self, query):
-        data = query.paginate(self.page, self.page_size, False)
+        # Fetch one extra row to find out whether there is a next page
+        rows = query.limit(self.page_size + 1).all()
+        next_cursor = None
+        if rows and len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            next_cursor = encode_cursor(rows[-1][1:])
+
+        return CursorPage([row[0] for row in rows], self.page_size, next_cursor)
+
+    def paginated_data(self, query, count_key=None, estimate=None):
+        """
+        Returns the requested page of `query`, or None when it is out of bounds.
+
+        count_key -- hashable description of the query's filters, identifying
+        its total count in the count cache
+        estimate -- callable returning an approximate total count or None, used
+        when the client asked for `count=estimate`
+        """
+        offset = (self.page - 1) * self.page_size
+
+        if self.count == 'none':
+            # Fetch one extra row to find out whether there is a next page
+            items = query.limit(self.page_size + 1).offset(offset).all()
+            if not items:
+                return None
+            return UncountedPage(self.page, self.page_size, items[:self.page_size],
+                                 len(items) > self.page_size)
+
+        items = query.limit(self.page_size).offset(offset).all()
+
+        total = estimate() if self.count == 'estimate' and estimate else None
+        if total is not None:
+            # An estimate can't tell whether the page exists, its items do
+            if not items:
+                return None
+            if len(items) < self.page_size:
+                total = offset + len(items)
+            else:
+                total = max(total, offset + len(items))
+            return Pagination(query, self.page, self.page_size, total, items)
+
+        total = self.total_count(query, count_key)
+        data = Pagination(query, self.page, self.page_size, total, items)
         if self.page > data.pages:
             return None
 
-        setattr(data, "per_page", self.page_size)
         return data
 
+    def total_count(self, query, count_key=None):
+        generation = count_cache.generation()
+        if count_key is not None and self.count != 'exact':
+            total = count_cache.get(count_key, generation=generation)
+            if total is not None:
+                return total
+
+        total = query.order_by(None).count()
+        if count_key is not None:
+            count_cache.set(count_key, total, generation=generation)
+        return total
+
     def details(self, paginated_data):
         return {
             "details": {
@@ -59,6 +197,26 @@ class Paginator:
             }
         }
 
+    def cursor_details(self, cursor_page):
+        return {
+            "details": {
+                "records_per_page": cursor_page.per_page,
+                "next_cursor": cursor_page.next_cursor,
+                "has_next": cursor_page.has_next
+            }
+        }
+
+
+def keyset_after(columns, values):
+    """Filter for rows sorting strictly after `values` on `columns`"""
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column > value
+    return or_(
+        column > value,
+        and_(column == value, keyset_after(columns[1:], values[1:]))
+    )
+
 
 def format_resource_search(hit):
     formatted = {
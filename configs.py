@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 from dataclasses import dataclass
 
 
@@ -39,6 +40,13 @@ if not all([algolia_app_id, algolia_api_key]):
 
 index_name = os.environ.get("INDEX_NAME")
 
+# The cache file is refused unless only this user can access it, see
+# SharedMemoryCache._open
+shm_dir = '/dev/shm'  # nosec B108
+if not os.path.isdir(shm_dir):
+    shm_dir = tempfile.gettempdir()
+cache_path = os.path.join(shm_dir, 'resources-api-cache')
+
 
 class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -53,3 +61,106 @@ class Config:
     RESOURCE_PAGINATOR = PaginatorConfig()
     LANGUAGE_PAGINATOR = PaginatorConfig()
     CATEGORY_PAGINATOR = PaginatorConfig()
+
+    # Where cached data lives: 'memory' keeps it in each process, 'shared' in a
+    # memory mapped file used by every uWSGI worker on the host, named after
+    # CACHE_PATH and the layout set by CACHE_SIZE and CACHE_SLOT_SIZE
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_PATH = os.environ.get('CACHE_PATH', cache_path)
+    # Maximum number of cached entries, each at most CACHE_SLOT_SIZE bytes
+    # compressed when shared
+    CACHE_SIZE = int(os.environ.get('CACHE_SIZE', 512))
+    CACHE_SLOT_SIZE = int(os.environ.get('CACHE_SLOT_SIZE', 64 * 1024))
+
+    # Total counts of paginated listings are cached per filter set until a
+    # resource is created or updated, or until they are this many seconds old
+    COUNT_CACHE_TTL = int(os.environ.get('COUNT_CACHE_TTL', 300))
+
+    # Responses of the read only resource, category and language endpoints
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+
+    # Changes to resources are written to the search index from an outbox,
+    # by a background thread of each process, right after the requests that
+    # made them and every INDEX_OUTBOX_INTERVAL seconds. 0 writes them in the
+    # request. Failed writes are retried after INDEX_OUTBOX_RETRY_DELAY
+    # seconds, twice as long after every failure up to
+    # INDEX_OUTBOX_MAX_RETRY_DELAY
+    INDEX_OUTBOX_INTERVAL = float(os.environ.get('INDEX_OUTBOX_INTERVAL', 30))
+    INDEX_OUTBOX_BATCH_SIZE = int(os.environ.get('INDEX_OUTBOX_BATCH_SIZE', 100))
+    INDEX_OUTBOX_RETRY_DELAY = float(os.environ.get('INDEX_OUTBOX_RETRY_DELAY', 5))
+    INDEX_OUTBOX_MAX_RETRY_DELAY = float(
+        os.environ.get('INDEX_OUTBOX_MAX_RETRY_DELAY', 600))
+
+    # `flask algolia sync` indexes the resources changed since the previous
+    # sync started, less this many seconds to catch the changes committed by
+    # transactions that were running then
+    INDEX_SYNC_OVERLAP = int(os.environ.get('INDEX_SYNC_OVERLAP', 60))
+
+    # Search answers are served from the cache for SEARCH_CACHE_TTL seconds,
+    # 0 turning the cache off. For SEARCH_CACHE_STALE_TTL seconds more, they
+    # are still served while a background thread searches again
+    SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 60))
+    SEARCH_CACHE_STALE_TTL = int(os.environ.get('SEARCH_CACHE_STALE_TTL', 600))
+
+    # API keys looked up to authenticate requests. Denying or rotating a key,
+    # also with the CLI, drops it from the cache of every worker of the host
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 300))
+    # Claims of verified JWTs, kept in each process until the tokens expire
+    JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', 1024))
+
+    # Number of proxies in front of the app, whose X-Forwarded-For header gives
+    # the address of the client
+    PROXY_COUNT = int(os.environ.get('PROXY_COUNT', 0))
+
+    # Requests per minute each client may send to each group of routes. Clients
+    # are told apart by their API key, or by their address when anonymous.
+    # Behind proxies every anonymous client would have the address of the last
+    # proxy, so limiting is off by default until PROXY_COUNT is set
+    RATE_LIMIT_ENABLED = os.environ.get(
+        'RATE_LIMIT_ENABLED', str(PROXY_COUNT > 0)).lower() == 'true'
+    RATE_LIMITS = {
+        group: int(os.environ.get(f'RATE_LIMIT_{group.upper()}', limit))
+        for group, limit in [
+            ('read', 300), ('search', 60), ('write', 30), ('vote', 60),
+            ('click', 120), ('apikey', 10)]
+    }
+    # Token buckets of the clients, in a cache of their own so they neither
+    # evict nor are evicted by cached data. Shared between the uWSGI workers
+    # through the file at RATE_LIMIT_CACHE_PATH with the 'shared' CACHE_BACKEND
+    RATE_LIMIT_CACHE_PATH = os.environ.get(
+        'RATE_LIMIT_CACHE_PATH', f'{cache_path}-rate-limit')
+    RATE_LIMIT_CACHE_SIZE = int(os.environ.get('RATE_LIMIT_CACHE_SIZE', 16384))
+
+    # Requests of authenticated users are logged by a background thread. At most
+    # AUDIT_LOG_QUEUE_SIZE records wait to be written, the others are dropped
+    AUDIT_LOG_QUEUE_SIZE = int(os.environ.get('AUDIT_LOG_QUEUE_SIZE', 1000))
+    # Request bodies are logged for this share of the requests, cut after
+    # AUDIT_LOG_MAX_PAYLOAD bytes
+    AUDIT_LOG_PAYLOAD_SAMPLE_RATE = float(
+        os.environ.get('AUDIT_LOG_PAYLOAD_SAMPLE_RATE', 1))
+    AUDIT_LOG_MAX_PAYLOAD = int(os.environ.get('AUDIT_LOG_MAX_PAYLOAD', 2048))
+
+    # Engine behind /search, see app.search: 'algolia', 'database' for the
+    # full text search of the database, or 'memory' for an index kept by each
+    # process. With SEARCH_FALLBACK, the database answers searches while
+    # Algolia is unreachable
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'algolia')
+    SEARCH_FALLBACK = os.environ.get('SEARCH_FALLBACK', 'true').lower() == 'true'
+
+    # Login endpoint of the Operation Code API, used to check membership
+    # before handing out API keys
+    OC_API_URL = os.environ.get(
+        'OC_API_URL', 'https://api.operationcode.org/auth/login/')
+    OC_API_CONNECT_TIMEOUT = float(os.environ.get('OC_API_CONNECT_TIMEOUT', 3.05))
+    OC_API_READ_TIMEOUT = float(os.environ.get('OC_API_READ_TIMEOUT', 10))
+    # After this many failed requests in a row, requests to the API fail right
+    # away for OC_API_RESET_TIMEOUT seconds
+    OC_API_FAILURE_THRESHOLD = int(os.environ.get('OC_API_FAILURE_THRESHOLD', 5))
+    OC_API_RESET_TIMEOUT = float(os.environ.get('OC_API_RESET_TIMEOUT', 30))
+
+    # Clicks are buffered and added to resources in batches every this many
+    # seconds, 0 writes every click right away
+    CLICK_FLUSH_INTERVAL = float(os.environ.get('CLICK_FLUSH_INTERVAL', 5))
+    # Answer clicks with 202 Accepted instead of the updated resource
+    CLICK_RESPONSE_ACCEPTED = \
+        os.environ.get('CLICK_RESPONSE_ACCEPTED', 'false').lower() == 'true'
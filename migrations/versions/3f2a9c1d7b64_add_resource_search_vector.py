@@ -0,0 +1,43 @@
+"""add resource search vector
+
+Revision ID: 3f2a9c1d7b64
+Revises: e6ac83ef4570
+Create Date: 2026-10-18 21:05:12.481210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b64'
+down_revision = 'e6ac83ef4570'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('resource', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.create_index('ix_resource_search_vector', 'resource', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+    # Same document as app.models.update_search_vector builds for new writes
+    op.execute("""
+        UPDATE resource SET search_vector =
+            setweight(to_tsvector('english', coalesce(resource.name, '')), 'A') ||
+            setweight(to_tsvector('english', concat_ws(' ',
+                resource.notes,
+                (SELECT category.name FROM category
+                 WHERE category.id = resource.category_id),
+                (SELECT string_agg(language.name, ' ')
+                 FROM language_identifier
+                 JOIN language ON language.id = language_identifier.language_id
+                 WHERE language_identifier.resource_id = resource.id)
+            )), 'B')
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_resource_search_vector', table_name='resource')
+    op.drop_column('resource', 'search_vector')
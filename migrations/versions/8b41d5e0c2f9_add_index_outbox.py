@@ -0,0 +1,34 @@
+"""add index outbox
+
+Revision ID: 8b41d5e0c2f9
+Revises: 3f2a9c1d7b64
+Create Date: 2026-10-18 22:14:37.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41d5e0c2f9'
+down_revision = '3f2a9c1d7b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('index_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('resource_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_index_outbox_next_attempt_at'), 'index_outbox', ['next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_index_outbox_next_attempt_at'), table_name='index_outbox')
+    op.drop_table('index_outbox')
@@ -0,0 +1,28 @@
+"""add index sync state
+
+Revision ID: c7e2a4f19d03
+Revises: 8b41d5e0c2f9
+Create Date: 2026-10-18 23:02:51.117640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a4f19d03'
+down_revision = '8b41d5e0c2f9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('index_sync_state',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('synced_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('index_sync_state')
@@ -0,0 +1,26 @@
+"""index category and language references
+
+Revision ID: e5b9d3a7c218
+Revises: c7e2a4f19d03
+Create Date: 2026-10-19 10:14:37.502913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9d3a7c218'
+down_revision = 'c7e2a4f19d03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_resource_category_id'), 'resource', ['category_id'], unique=False)
+    op.create_index(op.f('ix_language_identifier_language_id'), 'language_identifier', ['language_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_language_identifier_language_id'), table_name='language_identifier')
+    op.drop_index(op.f('ix_resource_category_id'), table_name='resource')
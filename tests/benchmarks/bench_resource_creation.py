@@ -0,0 +1,77 @@
+"""
+Compares creating a list of resources in a single transaction, as
+POST /api/v1/resources does, with the commit per resource it used to make.
+
+    python -m tests.benchmarks.bench_resource_creation [count] [rounds]
+
+Runs against a SQLite database in a temporary file, so that every commit is
+written to disk as it would be by Postgres.
+"""
+import tempfile
+
+from app import app, db
+from app.api.routes.helpers import ensure_bool
+from app.api.routes.resource_creation import create_resources
+from app.models import Category, Language, Resource
+from tests.benchmarks.helpers import median_time, report, resources_payload, run
+
+
+def get_attributes(json):
+    """How categories and languages were looked up for each resource"""
+    language_dict = {lang.key().lower(): lang for lang in Language.query.all()}
+    category_dict = {c.key(): c for c in Category.query.all()}
+
+    langs = []
+    for lang in json.get('languages') or []:
+        language = language_dict.get(lang.lower())
+        if not language:
+            language = Language(name=lang)
+        langs.append(language)
+    categ = category_dict.get(json.get('category'), Category(name=json.get('category')))
+    return (langs, categ)
+
+
+def create_one_by_one(json):
+    """The loop committing each resource that create_resources replaced"""
+    created_resources = []
+    for resource in json:
+        langs, categ = get_attributes(resource)
+        new_resource = Resource(
+            name=resource.get('name'),
+            url=resource.get('url'),
+            category=categ,
+            languages=langs,
+            free=ensure_bool(resource.get('free')),
+            notes=resource.get('notes'))
+        db.session.add(new_resource)
+        db.session.commit()
+        created_resources.append(new_resource.serialize())
+    return created_resources
+
+
+def create_together(json):
+    return create_resources(json, db)
+
+
+def main(count=200, rounds=5):
+    with tempfile.TemporaryDirectory() as directory:
+        app.config.update(
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{directory}/bench.db",
+            # Nothing to send to Algolia
+            SEARCH_BACKEND='database',
+            INDEX_OUTBOX_INTERVAL=0)
+
+        with app.test_request_context():
+            db.create_all()
+            for name, create in [('commit per resource', create_one_by_one),
+                                 ('single transaction', create_together)]:
+                timing = median_time(
+                    create, rounds,
+                    setup=lambda i: resources_payload(count, f"{name}/{i}/"),
+                    teardown=db.session.remove)
+                report(name, f"{timing * 1000:8.1f} ms", rounds, count)
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    run(main)
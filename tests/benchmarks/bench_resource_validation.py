@@ -0,0 +1,75 @@
+"""
+Compares checking the params of resources with the rules compiled once into
+`resource_schema`, as validate_resource does, with walking the table columns
+for every resource as it used to.
+
+    python -m tests.benchmarks.bench_resource_validation [count] [rounds]
+
+Only the params are checked, the URLs are looked up in the database in the
+same way by both.
+"""
+from app.api.validations import resource_schema
+from app.models import Resource
+from tests.benchmarks.helpers import median_time, report, resources_payload, run
+
+
+def payload(count):
+    json = resources_payload(count)
+    for i, resource in enumerate(json):
+        resource.update(free="true" if i % 2 else True, upvotes=i)
+    return json
+
+
+def walk_columns(method, json):
+    """How the params were checked for each resource"""
+    missing = []
+    invalid = []
+    required = []
+
+    for column in Resource.__table__.columns:
+        if column.info.get('internal'):
+            continue
+
+        col_name = column.name.replace('_id', '')
+        if method == 'POST':
+            if column.nullable is False and col_name != 'id':
+                required.append(col_name)
+
+        col_type = column.type.python_type
+        field = json.get(col_name)
+
+        if field is not None:
+            if col_name == 'category':
+                col_type = str
+            if col_type is str:
+                if type(field) in [int, float]:
+                    if col_name != 'url':
+                        continue
+            if col_type is bool:
+                if type(field) is str and field.lower() in ["false", "true"]:
+                    continue
+            if col_type is not type(field):
+                invalid.append(col_name)
+
+    for prop in required:
+        if json.get(prop) is None:
+            missing.append(prop)
+    return missing, invalid
+
+
+def main(count=200, rounds=20):
+    json = payload(count)
+
+    def check_all(check):
+        for resource in json:
+            check('POST', resource)
+
+    for name, check in [('walking the columns', walk_columns),
+                        ('compiled schema', resource_schema.check)]:
+        timing = median_time(check_all, rounds, setup=lambda _: check)
+        per_resource = timing / count * 1e6
+        report(name, f"{per_resource:8.2f} µs per resource", rounds, count)
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,38 @@
+"""Payloads and timing shared by the benchmarks"""
+import statistics
+import sys
+import time
+
+
+def resources_payload(count, prefix=''):
+    """`count` resources as POST /api/v1/resources takes them"""
+    return [dict(name=f"Resource {i}", url=f"https://example.org/{prefix}{i}",
+                 category=f"Category {i % 5}",
+                 languages=["Python", f"Language {i % 10}"],
+                 free=True, notes="Benchmark")
+            for i in range(count)]
+
+
+def median_time(function, rounds, setup=None, teardown=None):
+    """
+    Median of the seconds `function(setup(run))` takes over `rounds` runs,
+    calling `teardown()` after each, out of the timing
+    """
+    timings = []
+    for run in range(rounds):
+        args = setup(run) if setup else None
+        start = time.perf_counter()
+        function(args)
+        timings.append(time.perf_counter() - start)
+        if teardown:
+            teardown()
+    return statistics.median(timings)
+
+
+def report(name, timing, rounds, count):
+    print(f"{name:>20}: {timing} (median of {rounds}) for {count} resources")
+
+
+def run(main):
+    """Calls `main` with the numbers given on the command line"""
+    main(*map(int, sys.argv[1:]))
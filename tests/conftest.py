@@ -1,8 +1,11 @@
 import pytest
+import requests
 from algoliasearch.exceptions import (AlgoliaException,
                                       AlgoliaUnreachableHostException)
 from app import app
 from app import db as _db
+from app.api.oc_api import oc_api
+from app.cache import auth_cache, invalidate_catalog
 from app.utils import standardize_response
 from sqlalchemy.exc import DBAPIError
 
@@ -75,6 +78,14 @@ def module_client():
     flask_app = app
     flask_app.config['TESTING'] = True
     flask_app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE_URI
+    # Write clicks right away so they can be read back in the same test
+    flask_app.config['CLICK_FLUSH_INTERVAL'] = 0
+    # Index changes in the request, for the tests to check the index
+    flask_app.config['INDEX_OUTBOX_INTERVAL'] = 0
+    # Tests send many requests in a row from the same address
+    flask_app.config['RATE_LIMIT_ENABLED'] = False
+    # Tests search the same terms against different fake answers
+    flask_app.config['SEARCH_CACHE_TTL'] = 0
 
     # Flask provides a way to test your application by exposing the Werkzeug test Client
     # and handling the context locals for you.
@@ -95,6 +106,8 @@ def module_db():
     _db.create_all()
     from app.cli import import_resources
     import_resources(_db)
+    invalidate_catalog()
+    auth_cache.clear()
     yield _db  # this is where the testing happens!
 
     _db.drop_all()
@@ -104,6 +117,8 @@ def module_db():
 def function_empty_db():
     # Create the database and the database table
     _db.create_all()
+    invalidate_catalog()
+    auth_cache.clear()
     yield _db  # this is where the testing happens!
 
     _db.drop_all()
@@ -112,7 +127,7 @@ def function_empty_db():
 @pytest.fixture(scope='function')
 def fake_auth_from_oc(mocker):
     """
-    Changes the return value of requests.post to be a custom response
+    Changes the return value of the OC API client's post to be a custom response
     object so that we aren't validating external APIs in our unit tests
     """
 
@@ -122,19 +137,21 @@ def fake_auth_from_oc(mocker):
             return FakeExternalResponse()
 
     class FakeExternalResponse(object):
+        status_code = 200
+
         @classmethod
         def json(self):
             # The source code just checks that a value exists for 'token'
             # in the dict returned from the json method.
             return {'token': 'superlegittoken'}
 
-    mocker.patch("requests.post", return_value=FakeExternalResponse())
+    mocker.patch.object(oc_api.session, "post", return_value=FakeExternalResponse())
 
 
 @pytest.fixture(scope='function')
 def fake_invalid_auth_from_oc(mocker):
     """
-    Changes the return value of requests.post to be a custom response
+    Changes the return value of the OC API client's post to be a custom response
     object so that we aren't validating external APIs in our unit tests
     """
 
@@ -144,12 +161,26 @@ def fake_invalid_auth_from_oc(mocker):
             return FakeExternalResponse()
 
     class FakeExternalResponse(object):
+        status_code = 200
+
         @classmethod
         def json(self):
             # Mock an error returned from the OC backend
             return {'error': 'Invalid Email or password.'}
 
-    mocker.patch("requests.post", return_value=FakeExternalResponse())
+    mocker.patch.object(oc_api.session, "post", return_value=FakeExternalResponse())
+
+
+@pytest.fixture(scope='function')
+def fake_unreachable_oc(mocker):
+    """
+    Makes requests to the OC backend fail as if it were down
+    """
+    mocker.patch.object(oc_api.session, "post",
+                        side_effect=requests.ConnectionError("Connection refused"))
+    yield
+    # Don't let the failures open the circuit for the other tests
+    oc_api.breaker.record_success()
 
 
 @pytest.fixture(scope='function')
@@ -206,13 +237,17 @@ def fake_language_query_error(mocker):
 @pytest.fixture(scope='function')
 def fake_algolia_save(mocker):
     """
-    Mocks a save_object or partial_update_object call to algolia
+    Mocks a save_object, save_objects or partial_update_object call to algolia
     """
 
     mocker.patch(
         'algoliasearch.search_index.SearchIndex.save_object',
         return_value=None
     )
+    mocker.patch(
+        'algoliasearch.search_index.SearchIndex.save_objects',
+        return_value=None
+    )
     mocker.patch(
         'algoliasearch.search_index.SearchIndex.partial_update_object',
         return_value=None
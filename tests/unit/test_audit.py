@@ -0,0 +1,112 @@
+import io
+import json
+import logging
+import threading
+
+from flask import request
+from prometheus_client import REGISTRY
+
+from app import app
+from app.api.auth import log_request
+from app.audit import AsyncLogHandler, JsonFormatter
+from app.models import Key
+
+
+class BlockedHandler(logging.Handler):
+    """Handler that doesn't write anything until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.released.wait()
+        self.records.append(record)
+
+
+class CapturingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_async_log_handler_writes_json():
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    handler = AsyncLogHandler(output)
+    logger = logging.getLogger('test_async_log_handler')
+    logger.addHandler(handler)
+
+    try:
+        logger.warning({'user': 'test@example.org', 'payload': b'{"name": "x"}'})
+        logger.warning('Plain %s', 'message')
+    finally:
+        handler.stop()
+        logger.removeHandler(handler)
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first['user'] == 'test@example.org'
+    assert first['payload'] == '{"name": "x"}'
+    assert first['level'] == 'WARNING'
+    assert first['logger'] == 'test_async_log_handler'
+    assert second['message'] == 'Plain message'
+
+
+def test_async_log_handler_drops_records_when_full():
+    output = BlockedHandler()
+    handler = AsyncLogHandler(output, maxsize=2)
+    logger = logging.getLogger('test_async_log_handler_full')
+    logger.addHandler(handler)
+    dropped = REGISTRY.get_sample_value('audit_log_dropped_records_total') or 0
+
+    try:
+        # Two records fit in the queue, and one more if the blocked thread
+        # took the first one already. The others are dropped without waiting
+        for number in range(10):
+            logger.warning({'number': number})
+    finally:
+        output.released.set()
+        handler.stop()
+        logger.removeHandler(handler)
+
+    assert 2 <= len(output.records) <= 3
+    assert REGISTRY.get_sample_value(
+        'audit_log_dropped_records_total') == dropped + 10 - len(output.records)
+
+
+def test_log_request_truncates_payload():
+    config = app.config
+    max_payload = config['AUDIT_LOG_MAX_PAYLOAD']
+    sample_rate = config['AUDIT_LOG_PAYLOAD_SAMPLE_RATE']
+    handler = CapturingHandler()
+    logger = logging.getLogger('create_auth_logger')
+    logger.addHandler(handler)
+    key = Key(apikey='abcdef1234567890', email='test@example.org')
+    body = json.dumps([{'name': 'x' * 100}] * 100).encode()
+
+    try:
+        config['AUDIT_LOG_MAX_PAYLOAD'] = 64
+        with app.test_request_context('/api/v1/resources', method='POST', data=body):
+            log_request(request, key)
+
+        config['AUDIT_LOG_PAYLOAD_SAMPLE_RATE'] = 0
+        with app.test_request_context('/api/v1/resources', method='POST', data=body):
+            log_request(request, key)
+    finally:
+        config['AUDIT_LOG_MAX_PAYLOAD'] = max_payload
+        config['AUDIT_LOG_PAYLOAD_SAMPLE_RATE'] = sample_rate
+        logger.removeHandler(handler)
+
+    sampled, not_sampled = [record.msg for record in handler.records]
+    assert sampled['user'] == 'test@example.org'
+    assert sampled['route'] == '/api/v1/resources'
+    assert sampled['payload'] == body[:64]
+    assert sampled['payload_truncated'] is True
+    assert sampled['payload_size'] == len(body)
+    assert 'payload' not in not_sampled
+    assert not_sampled['payload_size'] == len(body)
@@ -1,10 +1,14 @@
 from unittest.mock import patch
 
 from app.api.auth import (ApiKeyError, ApiKeyErrorCode, authenticate,
-                          deny_key, find_key_by_apikey_or_email,
-                          rotate_key)
+                          cached_key, deny_key, find_key_by_apikey_or_email,
+                          forget_keys, rotate_key)
+from app.cache import Cache, SharedMemoryCache, auth_cache
 from app.models import Key
 from flask import g
+from prometheus_client import REGISTRY
+
+from .test_routes.helpers import count_queries
 
 FAKE_EMAIL = 'test@example.org'
 FAKE_APIKEY = 'abcdef1234567890'
@@ -19,6 +23,20 @@ def create_fake_key(session, **kwargs):
     return key
 
 
+def authenticate_with(apikey):
+    wrapper = authenticate(lambda: 1)
+    with patch('app.api.auth.request') as fake_request:
+        fake_request.headers = {
+            'x-apikey': apikey
+        }
+        return wrapper()
+
+
+def auth_cache_hits():
+    return REGISTRY.get_sample_value(
+        'cache_requests_total', {'cache': 'auth', 'result': 'hit'}) or 0
+
+
 def test_authenticate_failure(module_client, function_empty_db):
     # Arrange
     def callback(*args, **kwargs):
@@ -171,3 +189,82 @@ def test_rotate_key(module_client, function_empty_db):
 
     # Assert
     assert key.apikey != FAKE_APIKEY
+
+
+def test_authenticate_cached(module_client, function_empty_db):
+    # Arrange
+    key = create_fake_key(function_empty_db.session)
+    authenticate_with(FAKE_APIKEY)
+    hits = auth_cache_hits()
+
+    # Act
+    with count_queries(function_empty_db) as statements:
+        result = authenticate_with(FAKE_APIKEY)
+
+    # Assert
+    assert result == 1
+    assert g.auth_key == key
+    assert g.auth_key.email == FAKE_EMAIL
+    assert statements == []
+    assert auth_cache_hits() == hits + 1
+
+
+def test_deny_key_clears_cached_key(module_client, function_empty_db):
+    # Arrange
+    create_fake_key(function_empty_db.session)
+    assert authenticate_with(FAKE_APIKEY) == 1
+
+    # Act
+    deny_key(FAKE_APIKEY, True, function_empty_db.session)
+
+    # Assert
+    assert authenticate_with(FAKE_APIKEY)[1] == 401
+
+    deny_key(FAKE_APIKEY, False, function_empty_db.session)
+    assert authenticate_with(FAKE_APIKEY) == 1
+
+
+def test_rotate_key_clears_cached_key(module_client, function_empty_db):
+    # Arrange
+    create_fake_key(function_empty_db.session)
+    assert authenticate_with(FAKE_APIKEY) == 1
+    # The second time the key comes from the cache, detached from the session
+    assert authenticate_with(FAKE_APIKEY) == 1
+
+    # Act
+    key = rotate_key(g.auth_key, function_empty_db.session)
+
+    # Assert
+    assert authenticate_with(FAKE_APIKEY)[1] == 401
+    assert authenticate_with(key.apikey) == 1
+
+
+def test_deny_key_clears_workers_cached_key(
+        module_client, function_empty_db, tmp_path):
+    # Arrange: a worker with the shared cache, laid out unlike the config says
+    path = str(tmp_path / 'cache')
+    worker_cache = Cache('auth', backend=SharedMemoryCache(
+        path, slots=16, slot_size=1024))
+    key = create_fake_key(function_empty_db.session)
+    worker_cache.set(('apikey', FAKE_APIKEY),
+                     (key.id, key.apikey, key.email, key.denied))
+
+    # Act: the CLI, which keeps its own cache in memory, denies the key
+    with patch('app.cache.Config.CACHE_PATH', path):
+        deny_key(FAKE_APIKEY, True, function_empty_db.session)
+
+    # Assert
+    assert worker_cache.get(('apikey', FAKE_APIKEY)) is None
+
+
+def test_cached_key_changed_while_read(module_client, function_empty_db):
+    key = create_fake_key(function_empty_db.session)
+
+    class ChangedWhileRead:
+        def first(self):
+            # The key is denied between the lookup and storing it in the cache
+            forget_keys()
+            return key
+
+    assert cached_key(('apikey', FAKE_APIKEY), ChangedWhileRead()) is key
+    assert auth_cache.get(('apikey', FAKE_APIKEY)) is None
@@ -0,0 +1,55 @@
+import multiprocessing
+import threading
+
+from app.background import BackgroundThread
+
+
+def test_background_thread():
+    rounds = []
+    woken = threading.Event()
+
+    def run():
+        while not thread.sleep(60):
+            rounds.append(threading.current_thread().name)
+            woken.set()
+
+    thread = BackgroundThread('test-thread', run)
+    thread.start()
+    thread.start()
+    assert (thread.running())
+    assert ([t.name for t in threading.enumerate()].count('test-thread') == 1)
+
+    # Waking the thread cuts its sleep short
+    thread.wake()
+    assert (woken.wait(5))
+    assert (rounds == ['test-thread'])
+
+    thread.stop()
+    assert (not thread.running())
+    assert (rounds == ['test-thread'])
+
+    # It can be started again once stopped
+    thread.start()
+    assert (thread.running())
+    thread.stop()
+
+
+def test_background_thread_after_fork():
+    started = multiprocessing.get_context('fork').Queue()
+    thread = BackgroundThread('test-thread', lambda: thread.sleep(60))
+    thread.start()
+
+    def worker():
+        # The forked process has no thread of its own until it starts one
+        running = thread.running()
+        thread.start()
+        started.put((running, thread.running()))
+        thread.stop()
+
+    process = multiprocessing.get_context('fork').Process(target=worker)
+    process.start()
+    process.join()
+    thread.stop()
+
+    assert (process.exitcode == 0)
+    assert (started.get() == (False, True))
@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.cache import Cache, LRUCache, SharedMemoryCache
+
+
+def test_lru_cache_get_and_set():
+    cache = LRUCache(maxsize=2)
+
+    assert (cache.get('missing') is None)
+    assert (cache.get('missing', 'default') == 'default')
+
+    cache.set('a', 1)
+    assert (cache.get('a') == 1)
+    assert (len(cache) == 1)
+
+    cache.delete('a')
+    assert (cache.get('a') is None)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    # Reading 'a' makes 'b' the least recently used entry
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert (cache.get('a') == 1)
+    assert (cache.get('b') is None)
+    assert (cache.get('c') == 3)
+    assert (len(cache) == 2)
+
+    cache.clear()
+    assert (len(cache) == 0)
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(maxsize=10, ttl=60)
+
+    with patch('app.cache.time.monotonic', return_value=1000):
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=120)
+        cache.set('c', 3)
+
+    with patch('app.cache.time.monotonic', return_value=1059):
+        assert (cache.get('a') == 1)
+
+    with patch('app.cache.time.monotonic', return_value=1060):
+        assert (cache.get('a') is None)
+        assert (cache.get('b') == 2)
+
+
+def test_lru_cache_counters():
+    cache = LRUCache()
+
+    assert (cache.counter('generation') == 0)
+    assert (cache.incr('generation') == 1)
+    assert (cache.incr('generation') == 2)
+    assert (cache.counter('generation') == 2)
+    assert (cache.counter('other') == 0)
+
+
+def test_shared_memory_cache(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / 'cache'), slots=16, slot_size=1024)
+
+    assert (cache.get(('a', 1)) is None)
+    assert (cache.get(('a', 1), 'default') == 'default')
+
+    cache.set(('a', 1), {'data': [1, 2, 3]})
+    assert (cache.get(('a', 1)) == {'data': [1, 2, 3]})
+
+    cache.delete(('a', 1))
+    assert (cache.get(('a', 1)) is None)
+
+    # Values that don't fit in a slot are not cached
+    cache.set('large', os.urandom(2048))
+    assert (cache.get('large') is None)
+
+    cache.set('b', 2)
+    cache.clear()
+    assert (cache.get('b') is None)
+
+    assert (cache.counter('generation') == 0)
+    assert (cache.incr('generation') == 1)
+    assert (cache.counter('generation') == 1)
+
+
+def test_shared_memory_cache_ttl(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / 'cache'), slots=16, slot_size=1024)
+
+    with patch('app.cache.time.time', return_value=1000):
+        cache.set('a', 1, ttl=60)
+        cache.set('b', 2)
+
+    with patch('app.cache.time.time', return_value=1060):
+        assert (cache.get('a') is None)
+        assert (cache.get('b') == 2)
+
+
+def test_shared_memory_cache_between_processes(tmp_path):
+    path = str(tmp_path / 'cache')
+    cache = SharedMemoryCache(path, slots=16, slot_size=1024)
+    cache.set('before-fork', 1)
+
+    def worker():
+        # A forked worker sees the parent's entries and shares its writes
+        if cache.get('before-fork') == 1:
+            cache.set('from-child', 2)
+            cache.incr('generation')
+
+    process = multiprocessing.get_context('fork').Process(target=worker)
+    process.start()
+    process.join()
+
+    assert (process.exitcode == 0)
+    assert (cache.get('from-child') == 2)
+    assert (cache.counter('generation') == 1)
+
+    # As does any other process opening the same file
+    other = SharedMemoryCache(path, slots=16, slot_size=1024)
+    assert (other.get('from-child') == 2)
+    assert (other.incr('generation') == 2)
+    assert (cache.counter('generation') == 2)
+
+
+def test_cache_update(tmp_path):
+    for cache in (LRUCache(),
+                  SharedMemoryCache(str(tmp_path / 'cache'), slots=16, slot_size=1024)):
+        assert (cache.update('hits', lambda value: (value or 0) + 1) == 1)
+        assert (cache.update('hits', lambda value: (value or 0) + 1) == 2)
+        assert (cache.get('hits') == 2)
+
+
+def test_cache_generations():
+    backend = LRUCache()
+    catalog_cache = Cache('catalog-data', generations=['catalog'], backend=backend)
+    other_cache = Cache('other-data', backend=backend)
+
+    catalog_cache.set('key', 1)
+    other_cache.set('key', 2)
+    assert (catalog_cache.get('key') == 1)
+    assert (other_cache.get('key') == 2)
+
+    # Bumping a generation drops the entries of the caches built on it
+    backend.incr('catalog')
+    assert (catalog_cache.get('key') is None)
+    assert (other_cache.get('key') == 2)
+
+    other_cache.clear()
+    assert (other_cache.get('key') is None)
+
+
+def test_shared_memory_cache_refuses_open_file(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / 'cache'), slots=16, slot_size=1024)
+    path = Path(cache.path)
+    path.touch(mode=0o666)
+    path.chmod(0o666)
+
+    # Anyone able to write the file could make the process unpickle anything
+    with pytest.raises(PermissionError):
+        cache.set('key', 1)
+
+    path.chmod(0o600)
+    cache.set('key', 1)
+    assert (cache.get('key') == 1)
+
+
+def test_cache_set_after_clear():
+    cache = Cache('test', backend=LRUCache())
+
+    # A value read before the cache was cleared isn't stored
+    generation = cache.generation()
+    assert (cache.get('key', generation=generation) is None)
+    cache.clear()
+    cache.set('key', 'stale', generation=generation)
+    assert (cache.get('key') is None)
+
+    generation = cache.generation()
+    cache.set('key', 'fresh', generation=generation)
+    assert (cache.get('key', generation=generation) == 'fresh')
+
+
+def test_shared_memory_cache_layouts(tmp_path):
+    path = str(tmp_path / 'cache')
+    cache = SharedMemoryCache(path, slots=16, slot_size=1024)
+    cache.set('key', 1)
+
+    # Caches laid out differently never share a file
+    other = SharedMemoryCache(path, slots=32, slot_size=1024)
+    other.set('key', 2)
+    assert (cache.get('key') == 1)
+    assert ({c.path for c in SharedMemoryCache.attach_all(path)}
+            == {cache.path, other.path})
+
+    # A file of the wrong size is never resized under processes mapping it
+    with open(f'{path}-8x1024', 'wb') as f:
+        f.write(b'x')
+    os.chmod(f'{path}-8x1024', 0o600)
+    with pytest.raises(OSError):
+        SharedMemoryCache(path, slots=8, slot_size=1024).set('key', 3)
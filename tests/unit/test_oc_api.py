@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.api.oc_api import CircuitBreaker, CircuitOpenError, OCApiClient, OCApiError
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Login endpoint answering as `server.mode` says"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(self.client_address)
+
+        if self.server.mode == 'slow':
+            time.sleep(0.5)
+        if self.server.mode == 'error':
+            return self.answer(500, {'error': 'Down for maintenance'})
+        if body['password'] == 'right':
+            return self.answer(200, {'token': 'superlegittoken'})
+        return self.answer(401, {'error': 'Invalid Email or password.'})
+
+    def answer(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='function')
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.mode = 'ok'
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/auth/login/"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_login(stub_server):
+    client = OCApiClient(stub_server.url)
+
+    assert client.login('test@example.org', 'right') == {'token': 'superlegittoken'}
+    assert 'token' not in client.login('test@example.org', 'wrong')
+    assert client.login('test@example.org', 'right') == {'token': 'superlegittoken'}
+
+    # Every request went through the same connection
+    assert len(stub_server.requests) == 3
+    assert len(set(stub_server.requests)) == 1
+    assert client.breaker.state == 'closed'
+
+
+def test_login_timeout(stub_server):
+    stub_server.mode = 'slow'
+    client = OCApiClient(stub_server.url, read_timeout=0.1)
+
+    start = time.monotonic()
+    with pytest.raises(OCApiError):
+        client.login('test@example.org', 'right')
+    assert time.monotonic() - start < 0.5
+
+
+def test_circuit_opens_after_failures(stub_server):
+    stub_server.mode = 'error'
+    client = OCApiClient(
+        stub_server.url, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    for _ in range(2):
+        with pytest.raises(OCApiError):
+            client.login('test@example.org', 'right')
+    assert client.breaker.state == 'open'
+
+    # The upstream isn't called while the circuit is open
+    with pytest.raises(CircuitOpenError):
+        client.login('test@example.org', 'right')
+    assert len(stub_server.requests) == 2
+
+
+def test_circuit_closes_after_successful_trial(stub_server):
+    stub_server.mode = 'error'
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    client = OCApiClient(stub_server.url, breaker=breaker)
+
+    with pytest.raises(OCApiError):
+        client.login('test@example.org', 'right')
+    assert client.breaker.state == 'open'
+
+    time.sleep(0.05)
+    assert client.breaker.state == 'half-open'
+
+    # A failed trial opens the circuit again
+    with pytest.raises(OCApiError):
+        client.login('test@example.org', 'right')
+    assert client.breaker.state == 'open'
+
+    time.sleep(0.05)
+    stub_server.mode = 'ok'
+    assert client.login('test@example.org', 'right') == {'token': 'superlegittoken'}
+    assert client.breaker.state == 'closed'
@@ -0,0 +1,90 @@
+import threading
+
+from algoliasearch.exceptions import AlgoliaUnreachableHostException
+
+from app import db
+from app.models import IndexOutbox, Resource
+from app.outbox import (
+    OutboxWorker, drain_outbox, enqueue_index_writes, retry_delay)
+
+
+def saved_ids(save):
+    return [[obj['id'] for obj in call[0][0]] for call in save.call_args_list]
+
+
+def test_drain_outbox(module_client, module_db, mocker):
+    first, second, third = Resource.query.order_by(Resource.id).limit(3).all()
+    IndexOutbox.query.delete()
+    for resource in [first, second, third, first]:
+        db.session.add(IndexOutbox(resource_id=resource.id))
+    db.session.commit()
+
+    save = mocker.patch(
+        'algoliasearch.search_index.SearchIndex.save_objects',
+        side_effect=AlgoliaUnreachableHostException('Unreachable hosts'))
+
+    # A failed batch stays in the outbox, and waits before being tried again
+    assert (drain_outbox(batch_size=2) == 0)
+    entries = IndexOutbox.query.order_by(IndexOutbox.id).all()
+    assert ([entry.attempts for entry in entries] == [1, 1, 0, 0])
+    assert (entries[0].last_error == 'Unreachable hosts')
+    assert (entries[0].next_attempt_at is not None)
+
+    save.side_effect = None
+    assert (drain_outbox(batch_size=2) == 2)
+    assert (sorted(saved_ids(save)[-1]) == sorted([third.id, first.id]))
+    assert (IndexOutbox.query.count() == 2)
+
+    # Waiting rows are drained once their delay is over, in batches, each
+    # resource once per batch
+    IndexOutbox.query.update({'next_attempt_at': None})
+    db.session.add(IndexOutbox(resource_id=first.id))
+    db.session.commit()
+    assert (drain_outbox(batch_size=10) == 3)
+    assert (sorted(saved_ids(save)[-1]) == [first.id, second.id])
+    assert (IndexOutbox.query.count() == 0)
+
+
+def test_outbox_worker(module_client, module_db, mocker):
+    config = module_client.application.config
+    saved = threading.Event()
+    save = mocker.patch('algoliasearch.search_index.SearchIndex.save_objects',
+                        side_effect=lambda objects: saved.set())
+    resource = Resource.query.first()
+    enqueue_index_writes([resource])
+    db.session.commit()
+
+    worker = OutboxWorker()
+    config['INDEX_OUTBOX_INTERVAL'] = 60
+    try:
+        # Drained by the background thread without waiting for the interval
+        worker.notify(module_client.application)
+        assert (saved.wait(5))
+    finally:
+        worker.stop()
+        config['INDEX_OUTBOX_INTERVAL'] = 0
+
+    assert (saved_ids(save) == [[resource.id]])
+    assert (IndexOutbox.query.count() == 0)
+
+
+def test_retry_delay(module_client, module_db):
+    config = module_client.application.config
+    base = config['INDEX_OUTBOX_RETRY_DELAY']
+    maximum = config['INDEX_OUTBOX_MAX_RETRY_DELAY']
+
+    assert (retry_delay(1) == base)
+    assert (retry_delay(3) == base * 4)
+    assert (retry_delay(100) == maximum)
+
+
+def test_drain_outbox_locks_resources(module_client, module_db, mocker):
+    resource = Resource.query.first()
+    IndexOutbox.query.delete()
+    db.session.add(IndexOutbox(resource_id=resource.id))
+    db.session.commit()
+    mocker.patch('algoliasearch.search_index.SearchIndex.save_objects')
+    lock = mocker.patch('app.outbox.lock_resources')
+
+    assert (drain_outbox() == 1)
+    lock.assert_called_once_with({resource.id})
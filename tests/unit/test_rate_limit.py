@@ -0,0 +1,66 @@
+import multiprocessing
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.api.rate_limit import TokenBucketLimiter, create_limiter_backend
+from app.cache import LRUCache, SharedMemoryCache
+
+
+def test_token_bucket():
+    limiter = TokenBucketLimiter(LRUCache())
+
+    with patch('app.api.rate_limit.time.time', return_value=1000):
+        limits = [limiter.hit('client', capacity=3) for _ in range(4)]
+        other_client = limiter.hit('other-client', capacity=3)
+
+    assert ([limit.remaining for limit in limits] == [2, 1, 0, 0])
+    assert ([limit.retry_after for limit in limits] == [None, None, None, 20])
+    assert (limits[-1].limit == 3)
+    assert (limits[-1].reset == 60)
+    assert (other_client.retry_after is None)
+
+    # A token is added every 20 seconds
+    with patch('app.api.rate_limit.time.time', return_value=1020):
+        limit = limiter.hit('client', capacity=3)
+    assert (limit.retry_after is None)
+    assert (limit.remaining == 0)
+
+    # The bucket never holds more than its capacity
+    with patch('app.api.rate_limit.time.time', return_value=5000):
+        limit = limiter.hit('client', capacity=3)
+    assert (limit.remaining == 2)
+
+
+def test_token_bucket_between_processes(tmp_path):
+    limiter = TokenBucketLimiter(
+        SharedMemoryCache(str(tmp_path / 'cache'), slots=16, slot_size=1024))
+    allowed = multiprocessing.get_context('fork').Queue()
+
+    def worker():
+        allowed.put(sum(limiter.hit('client', capacity=20, period=3600)
+                        .retry_after is None for _ in range(10)))
+
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=worker) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    # The workers share one bucket
+    assert (sum(allowed.get() for _ in processes) == 20)
+
+
+def test_limiter_backend_apart_from_cache(tmp_path):
+    config = SimpleNamespace(
+        CACHE_BACKEND='shared', RATE_LIMIT_CACHE_PATH=str(tmp_path / 'buckets'),
+        RATE_LIMIT_CACHE_SIZE=1)
+    cache = SharedMemoryCache(str(tmp_path / 'cache'), slots=1, slot_size=1024)
+    limiter = TokenBucketLimiter(create_limiter_backend(config))
+    cache.set('payload', 'cached')
+
+    # Even with a single slot each, buckets and cached data don't evict each other
+    assert (limiter.hit('client', capacity=3).remaining == 2)
+    assert (cache.get('payload') == 'cached')
+    cache.set('other-payload', 'cached')
+    assert (limiter.hit('client', capacity=3).remaining == 1)
@@ -1,4 +1,8 @@
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
 from app.api.validations import (
     MISSING_PARAMS, INVALID_PARAMS, MISSING_BODY, INVALID_TYPE
 )
@@ -68,6 +72,21 @@ def set_resource_last_updated(updated_time=(datetime.now() + timedelta(days=-7))
         db.session.commit()
 
 
+@contextmanager
+def count_queries(db):
+    """Collects every SQL statement executed on `db` inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
 def get_api_key(client):
     response = client.post('api/v1/apikey', json=dict(
         email="test@example.org",
@@ -72,6 +72,17 @@ def test_get_api_key_denied(module_client, module_db, fake_auth_from_oc):
         deny_key(apikey, False, module_db.session)
 
 
+def test_get_api_key_oc_unavailable(module_client, module_db, fake_unreachable_oc):
+    client = module_client
+
+    response = client.post('api/v1/apikey', json=dict(
+        email="test@example.org",
+        password="supersecurepassword"
+    ))
+
+    assert_correct_response(response, 503)
+
+
 def test_rotate_api_key_unauthorized(module_client, module_db):
     client = module_client
 
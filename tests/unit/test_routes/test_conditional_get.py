@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from werkzeug.http import http_date
+
+from .helpers import count_queries, get_api_key
+
+
+def test_etag_not_modified(module_client, module_db):
+    client = module_client
+
+    for endpoint in ['api/v1/resources', 'api/v1/resources/3',
+                     'api/v1/categories', 'api/v1/languages/2']:
+        response = client.get(endpoint)
+        etag = response.headers['ETag']
+        assert (response.status_code == 200)
+        assert (response.headers['Last-Modified'])
+
+        with count_queries(module_db) as statements:
+            response = client.get(endpoint, headers={'If-None-Match': etag})
+        assert (response.status_code == 304)
+        assert (response.data == b'')
+        assert (response.headers['ETag'] == etag)
+        assert (statements == [])
+
+        response = client.get(endpoint, headers={'If-None-Match': '"outdated"'})
+        assert (response.status_code == 200)
+
+
+def test_etag_changes_with_catalog(module_client, module_db):
+    client = module_client
+
+    etag = client.get('api/v1/resources/2').headers['ETag']
+    other_page = client.get('api/v1/resources?page=2').headers['ETag']
+    assert (etag != other_page)
+
+    client.put('/api/v1/resources/2/click')
+
+    response = client.get('api/v1/resources/2', headers={'If-None-Match': etag})
+    assert (response.status_code == 200)
+    assert (response.headers['ETag'] != etag)
+
+
+def test_etag_depends_on_caller(module_client, module_db, fake_auth_from_oc):
+    client = module_client
+    apikey = get_api_key(client)
+
+    anonymous = client.get('api/v1/resources/4')
+    response = client.get('api/v1/resources/4', headers={
+        'x-apikey': apikey,
+        'If-None-Match': anonymous.headers['ETag']
+    })
+
+    assert (response.status_code == 200)
+    assert (response.headers['ETag'] != anonymous.headers['ETag'])
+    assert ('x-apikey' in response.headers['Vary'])
+
+
+def test_if_modified_since(module_client, module_db):
+    client = module_client
+
+    response = client.get('api/v1/categories')
+    last_modified = response.headers['Last-Modified']
+
+    response = client.get('api/v1/categories',
+                          headers={'If-Modified-Since': last_modified})
+    assert (response.status_code == 304)
+
+    long_ago = http_date(datetime.utcnow() - timedelta(days=3650))
+    response = client.get('api/v1/categories', headers={'If-Modified-Since': long_ago})
+    assert (response.status_code == 200)
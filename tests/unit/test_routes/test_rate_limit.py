@@ -0,0 +1,58 @@
+import pytest
+
+from app.api.rate_limit import limiter
+from .helpers import assert_correct_response, get_api_key
+
+
+@pytest.fixture(scope='function')
+def rate_limits(module_client):
+    config = module_client.application.config
+    limits = config['RATE_LIMITS']
+    config['RATE_LIMIT_ENABLED'] = True
+    config['RATE_LIMITS'] = dict(limits, read=2, vote=1)
+    limiter.backend.clear()
+
+    yield config['RATE_LIMITS']
+
+    config['RATE_LIMIT_ENABLED'] = False
+    config['RATE_LIMITS'] = limits
+    limiter.backend.clear()
+
+
+def test_rate_limit(module_client, module_db, rate_limits):
+    client = module_client
+
+    response = client.get('api/v1/resources/1')
+    assert (response.status_code == 200)
+    assert (response.headers['X-RateLimit-Limit'] == '2')
+    assert (response.headers['X-RateLimit-Remaining'] == '1')
+    assert (int(response.headers['X-RateLimit-Reset']) > 0)
+
+    # Routes of the same group share the budget
+    response = client.get('api/v1/categories')
+    assert (response.status_code == 200)
+    assert (response.headers['X-RateLimit-Remaining'] == '0')
+
+    response = client.get('api/v1/languages')
+    assert_correct_response(response, 429)
+    assert (response.headers['X-RateLimit-Remaining'] == '0')
+    assert (int(response.headers['Retry-After']) > 0)
+
+
+def test_rate_limit_by_api_key(
+        module_client, module_db, fake_auth_from_oc, rate_limits):
+    client = module_client
+    apikey = get_api_key(client)
+
+    response = client.put('api/v1/resources/1/upvote', headers={'x-apikey': apikey})
+    assert (response.status_code == 200)
+
+    response = client.put('api/v1/resources/1/upvote', headers={'x-apikey': apikey})
+    assert_correct_response(response, 429)
+
+    # Anonymous clients are limited by address, apart from the API key
+    for _ in range(2):
+        response = client.get('api/v1/resources/1')
+        assert (response.status_code == 200)
+    response = client.get('api/v1/resources/1', headers={'x-apikey': apikey})
+    assert (response.status_code == 200)
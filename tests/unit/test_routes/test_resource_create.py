@@ -1,6 +1,11 @@
 from datetime import datetime
+
+from app.api.routes.helpers import AttributeResolver
+from app.api.validations import resource_schema, validate_resource_list
+from app.models import Category, Language, Resource
+from app.utils import random_string
 from .helpers import (
-    create_resource, get_api_key, assert_missing_body,
+    count_queries, create_resource, get_api_key, assert_missing_body,
     assert_invalid_create, assert_missing_params_create,
     assert_wrong_type
 )
@@ -210,6 +215,38 @@ def test_create_multiple_resources(
     assert (response.get_json().get("errors")[0].get("index") == 1)
 
 
+def test_create_resources_together(
+        module_client, module_db, fake_auth_from_oc, fake_algolia_save):
+    client = module_client
+    apikey = get_api_key(client)
+    language = f"Language {datetime.now()}"
+    url = f"http://example.net/{datetime.now()}"
+    data = [dict(name=f"Name {i}", url=f"{url}/{i}", category="Shared Category",
+                 languages=[language, "Python"], free=True) for i in range(3)]
+
+    # A URL repeated in the list fails the whole list, nothing is created
+    data.append(dict(data[0], name="Repeated URL"))
+    response = client.post('/api/v1/resources', json=data,
+                           headers={'x-apikey': apikey})
+    assert (response.status_code == 422)
+    errors = response.get_json().get("errors")
+    assert ([error.get("index") for error in errors] == [3])
+    assert ("index 0" in errors[0].get("invalid-params").get("message"))
+    assert (Resource.query.filter(Resource.url.like(f"{url}%")).count() == 0)
+
+    # New categories and languages are created once, for all the resources
+    response = client.post('/api/v1/resources', json=data[:3],
+                           headers={'x-apikey': apikey})
+    assert (response.status_code == 200)
+    created = response.get_json().get("resources")
+    assert ([resource["url"] for resource in created]
+            == [resource["url"] for resource in data[:3]])
+    assert (all(sorted(resource["languages"]) == sorted([language, "Python"])
+                for resource in created))
+    assert (Language.query.filter_by(name=language).count() == 1)
+    assert (Category.query.filter_by(name="Shared Category").count() == 1)
+
+
 def test_create_resource_wrong_type(
         module_client, module_db, fake_auth_from_oc, fake_algolia_save):
     client = module_client
@@ -247,3 +284,63 @@ def test_false_validation():
 
     # TODO: implement
     pass
+
+
+def test_attribute_resolver(module_client, module_db):
+    new_category, new_language = random_string(), random_string()
+    rlist = [dict(category="Books", languages=["python", "JavaScript"]),
+             dict(category="Books", languages=["Python", new_language.upper()]),
+             dict(category=new_category, languages=[new_language])]
+    resolver = AttributeResolver()
+    with count_queries(module_db) as statements:
+        resolver.resolve(rlist)
+        categories = [resolver.category(r) for r in rlist]
+        languages = [resolver.languages(r) for r in rlist]
+        resolver.resolve(rlist)
+
+    # One query per table, for all the resources
+    assert (len(statements) == 2)
+    assert ([category.name for category in categories]
+            == ["Books", "Books", new_category])
+    assert (categories[0] is categories[1] and categories[0].id is not None)
+    assert (categories[2].id is None)
+    python, javascript = languages[0]
+    assert ((python.name, javascript.name) == ("Python", "JavaScript"))
+    assert (languages[1][0] is python)
+    assert (languages[1][1] is languages[2][0])
+    assert (languages[2][0].id is None)
+
+
+def test_validate_resource_list_urls(module_client, module_db):
+    existing = Resource.query.first()
+    url = f"https://example.org/{random_string()}"
+    rlist = [dict(name="Name", url=f"{url}/{i}", category="Books", free=True)
+             for i in range(50)]
+    rlist.append(dict(rlist[0], url=str(existing.url)))
+    rlist.append(dict(rlist[0], url=f"{url}/3"))
+
+    with count_queries(module_db) as statements:
+        errors = validate_resource_list('POST', rlist)['errors']
+
+    # All the URLs are checked with one query
+    assert (len(statements) == 1)
+    assert ([error['index'] for error in errors] == [50, 51])
+    taken, repeated = [error['invalid-params'] for error in errors]
+    assert (taken['params'] == ['url'])
+    assert (f"Resource id {existing.id} already" in taken['message'])
+    assert (taken['resource'].endswith(f"/{existing.id}"))
+    assert (repeated['params'] == ['url'])
+    assert ("Resource at index 3 already" in repeated['message'])
+
+
+def test_resource_schema():
+    assert (resource_schema.required == ['name', 'url', 'category', 'free'])
+    assert ('search_vector' not in [name for name, *_ in resource_schema.fields])
+
+    assert (resource_schema.check('POST', dict(
+        name=1, url="https://example.org", category="Books", free="False",
+        notes=2.5)) == ([], []))
+    assert (resource_schema.check('POST', dict(
+        name=[], url=1, free="yes", upvotes="1")) == (
+        ['category'], ['name', 'url', 'free', 'upvotes']))
+    assert (resource_schema.check('PUT', dict(free=False)) == ([], []))
@@ -1,8 +1,10 @@
 
 from datetime import datetime, timedelta
+from unittest.mock import patch
+
 from .helpers import (
     create_resource, update_resource, get_api_key, set_resource_last_updated,
-    assert_correct_response
+    assert_correct_response, count_queries
 )
 
 
@@ -186,3 +188,211 @@ def test_updated_after_filter(module_client,
                 filter_time <= datetime.strptime(resource.get('last_updated'),
                                                  '%Y-%m-%d %H:%M:%S')
         )
+
+
+def test_get_resources_query_count(module_client, module_db, fake_auth_from_oc):
+    client = module_client
+    apikey = get_api_key(client)
+    headers = {'x-apikey': apikey}
+
+    for id in range(1, 6):
+        client.put(f"/api/v1/resources/{id}/upvote", headers=headers)
+    client.get('api/v1/resources?page_size=1', headers=headers)
+
+    with count_queries(module_db) as small_page:
+        response = client.get('api/v1/resources?page_size=5&count=exact',
+                              headers=headers)
+    assert (response.status_code == 200)
+    assert (len(response.json['resources']) == 5)
+
+    with count_queries(module_db) as large_page:
+        response = client.get('api/v1/resources?page_size=100&count=exact',
+                              headers=headers)
+    assert (response.status_code == 200)
+    assert (len(response.json['resources']) == 100)
+
+    assert (len(small_page) == len(large_page))
+
+    directions = {
+        resource['id']: resource['user_vote_direction']
+        for resource in response.json['resources']
+    }
+    for id in range(1, 6):
+        assert (directions[id] == 'upvote')
+
+
+def test_get_single_resource_vote_direction(
+        module_client, module_db, fake_auth_from_oc):
+    client = module_client
+    apikey = get_api_key(client)
+    headers = {'x-apikey': apikey}
+    id = 6
+
+    client.put(f"/api/v1/resources/{id}/downvote", headers=headers)
+
+    with count_queries(module_db) as statements:
+        response = client.get(f"api/v1/resources/{id}", headers=headers)
+
+    assert (response.status_code == 200)
+    assert (response.json['resource']['user_vote_direction'] == 'downvote')
+
+    # Only the caller's vote is looked up, never every vote on the resource
+    vote_queries = [s for s in statements if 'FROM vote_information' in s]
+    assert (len(vote_queries) == 1)
+    assert ('vote_information.voter_apikey = ?' in vote_queries[0])
+
+    response = client.get(f"api/v1/resources/{id}")
+    assert (response.json['resource']['user_vote_direction'] is None)
+
+
+def test_get_resources_cursor(module_client, module_db):
+    client = module_client
+
+    total_count = client.get('api/v1/resources').json['total_count']
+    offset_ids = [
+        resource['id'] for resource in
+        client.get('api/v1/resources?page_size=200').json['resources']
+    ]
+
+    cursor_ids = []
+    cursor = ''
+    while True:
+        with count_queries(module_db) as statements:
+            response = client.get(f"api/v1/resources?page_size=50&cursor={cursor}")
+        assert (response.status_code == 200)
+        assert not any('count(' in s for s in statements)
+
+        cursor_ids.extend(resource['id'] for resource in response.json['resources'])
+        assert (response.json['records_per_page'] == 50)
+        if not response.json['has_next']:
+            assert (response.json['next_cursor'] is None)
+            break
+        cursor = response.json['next_cursor']
+
+    # Same ordering as the page based listing, with every resource exactly once
+    assert (len(cursor_ids) == total_count)
+    assert (len(set(cursor_ids)) == total_count)
+    assert (cursor_ids[:len(offset_ids)] == offset_ids)
+
+
+def test_get_resources_cursor_with_filters(module_client, module_db):
+    client = module_client
+
+    total_count = client.get('api/v1/resources?free=false').json['total_count']
+    response = client.get('api/v1/resources?free=false&cursor=&page_size=5')
+
+    assert (response.status_code == 200)
+    assert all([not res.get('free') for res in response.json['resources']])
+
+    seen = len(response.json['resources'])
+    while response.json['has_next']:
+        cursor = response.json['next_cursor']
+        response = client.get(
+            f"api/v1/resources?free=false&cursor={cursor}&page_size=5")
+        assert all([not res.get('free') for res in response.json['resources']])
+        seen += len(response.json['resources'])
+    assert (seen == total_count)
+
+
+def test_get_resources_cursor_page_size_zero(module_client, module_db):
+    response = module_client.get('api/v1/resources?cursor=&page_size=0')
+    assert (response.status_code == 200)
+    assert (response.json['resources'])
+    assert (response.json['next_cursor'])
+
+
+def test_get_resources_invalid_cursor(module_client, module_db):
+    client = module_client
+
+    response = client.get('api/v1/resources?cursor=not-a-cursor')
+    assert_correct_response(response, 422)
+
+    response = client.get('api/v1/resources?cursor=WzEsMiwzXQ')
+    assert_correct_response(response, 422)
+
+    # Values other than ints: ["a","b"], [1.5,2] and [true,2]
+    for cursor in ['WyJhIiwiYiJd', 'WzEuNSwyXQ', 'W3RydWUsMl0']:
+        response = client.get(f"api/v1/resources?cursor={cursor}")
+        assert_correct_response(response, 422)
+
+
+def test_get_resources_count_cache(
+        module_client, module_db, fake_auth_from_oc, fake_algolia_save):
+    client = module_client
+    apikey = get_api_key(client)
+
+    total_count = client.get('api/v1/resources?free=true').json['total_count']
+
+    # The count of a filter set is only computed once
+    with count_queries(module_db) as statements:
+        response = client.get('api/v1/resources?free=TRUE&page=2')
+    assert (response.json['total_count'] == total_count)
+    assert not any('count(' in s for s in statements)
+
+    with count_queries(module_db) as statements:
+        response = client.get('api/v1/resources?free=true&count=exact')
+    assert (response.json['total_count'] == total_count)
+    assert any('count(' in s for s in statements)
+
+    # Creating a resource invalidates the cached counts
+    create_resource(client, apikey, free=True)
+    response = client.get('api/v1/resources?free=true')
+    assert (response.json['total_count'] == total_count + 1)
+
+    # Estimates fall back to the exact count without database statistics
+    response = client.get('api/v1/resources?count=estimate')
+    assert (response.json['total_count'] ==
+            client.get('api/v1/resources?count=exact').json['total_count'])
+
+
+def test_get_resources_estimated_count(module_client, module_db):
+    client = module_client
+    total_count = client.get('api/v1/resources?count=exact').json['total_count']
+    last_page = -(-total_count // 10)
+    url = 'api/v1/resources?count=estimate&page_size=10&page='
+    estimate = 'app.api.routes.resource_retrieval.estimate_row_count'
+
+    # Too low an estimate doesn't hide the pages after it
+    with patch(estimate, return_value=5):
+        response = client.get(f"{url}{last_page}")
+        assert (response.status_code == 200)
+        assert (response.json['resources'])
+        assert (response.json['total_count'] == total_count)
+
+        response = client.get(f"{url}2")
+        assert (response.status_code == 200)
+        assert (response.json['total_count'] >= 20)
+
+    # Too high an estimate doesn't make up pages after the last one
+    with patch(estimate, return_value=total_count * 10):
+        response = client.get(f"{url}1")
+        assert (response.json['total_count'] == total_count * 10)
+
+        response = client.get(f"{url}{last_page + 1}", follow_redirects=True)
+        assert_correct_response(response, 404)
+
+
+def test_get_resources_without_count(module_client, module_db):
+    client = module_client
+
+    with count_queries(module_db) as statements:
+        response = client.get('api/v1/resources?count=none&page_size=10')
+    assert (response.status_code == 200)
+    assert not any('count(' in s for s in statements)
+    assert (len(response.json['resources']) == 10)
+    assert (response.json['total_count'] is None)
+    assert (response.json['number_of_pages'] is None)
+    assert (response.json['has_next'] is True)
+    assert (response.json['has_prev'] is False)
+
+    total_count = client.get('api/v1/resources').json['total_count']
+    last_page = (total_count + 9) // 10
+    response = client.get(f"api/v1/resources?count=none&page_size=10&page={last_page}")
+    assert (response.status_code == 200)
+    assert (response.json['has_next'] is False)
+    assert (response.json['has_prev'] is True)
+
+    response = client.get(
+        f"api/v1/resources?count=none&page_size=10&page={last_page + 1}",
+        follow_redirects=True)
+    assert_correct_response(response, 404)
@@ -1,5 +1,7 @@
+from app.cache import count_cache
+from app.clicks import click_buffer
 from .helpers import (
-    update_resource, get_api_key, assert_wrong_type,
+    count_queries, update_resource, get_api_key, assert_wrong_type,
     assert_correct_response
 )
 
@@ -399,3 +401,61 @@ def test_delete_unused_categories(module_client, module_db,
                      for category in db_categories.json['categories']]
 
     assert (test_cat_1 not in db_categories)
+
+
+def test_add_click_buffered(module_client, module_db):
+    client = module_client
+    config = client.application.config
+    config['CLICK_FLUSH_INTERVAL'] = 3600
+    id = 1
+
+    try:
+        initial_click_count = client.get(
+            f"api/v1/resources/{id}").json['resource'].get("times_clicked")
+
+        # Pending clicks are added to the response but not written yet
+        for _ in range(3):
+            with count_queries(module_db) as statements:
+                response = client.put(f"/api/v1/resources/{id}/click")
+            assert (response.status_code == 200)
+            # The resource is read once, its count isn't reloaded
+            assert (sum('FROM resource' in s for s in statements) == 1)
+        clicks = response.json['resource'].get("times_clicked")
+        assert (clicks == initial_click_count + 3)
+        assert (click_buffer.pending(id) == 3)
+
+        # Clicks don't change the counts of the listings
+        count_generation = count_cache.generation()
+        with client.application.app_context():
+            assert (click_buffer.flush() == 1)
+        assert (click_buffer.pending(id) == 0)
+        assert (count_cache.generation() == count_generation)
+
+        data = client.get(f"api/v1/resources/{id}").json['resource']
+        assert (data.get("times_clicked") == initial_click_count + 3)
+    finally:
+        click_buffer.stop()
+        config['CLICK_FLUSH_INTERVAL'] = 0
+
+
+def test_add_click_accepted(module_client, module_db):
+    client = module_client
+    config = client.application.config
+    config['CLICK_RESPONSE_ACCEPTED'] = True
+    id = 1
+
+    try:
+        initial_click_count = client.get(
+            f"api/v1/resources/{id}").json['resource'].get("times_clicked")
+
+        response = client.put(f"/api/v1/resources/{id}/click")
+        assert (response.status_code == 202)
+        assert (response.json['resource'] == {'id': id})
+
+        data = client.get(f"api/v1/resources/{id}").json['resource']
+        assert (data.get("times_clicked") == initial_click_count + 1)
+
+        response = client.put("/api/v1/resources/99999999/click", follow_redirects=True)
+        assert_correct_response(response, 404)
+    finally:
+        config['CLICK_RESPONSE_ACCEPTED'] = False
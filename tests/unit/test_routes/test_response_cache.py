@@ -0,0 +1,86 @@
+from prometheus_client import REGISTRY
+
+from .helpers import count_queries, create_resource, get_api_key, update_resource
+
+
+def cache_requests(result):
+    return REGISTRY.get_sample_value(
+        'cache_requests_total', {'cache': 'response', 'result': result}) or 0
+
+
+def test_cached_listing_skips_database(module_client, module_db):
+    client = module_client
+
+    hits, misses = cache_requests('hit'), cache_requests('miss')
+    first = client.get('api/v1/resources?page=2&page_size=7')
+
+    with count_queries(module_db) as statements:
+        second = client.get('api/v1/resources?page_size=7&page=2')
+
+    assert (second.status_code == 200)
+    assert (second.json == first.json)
+    assert (statements == [])
+    assert (cache_requests('miss') == misses + 1)
+    assert (cache_requests('hit') == hits + 1)
+
+    for endpoint in ['api/v1/resources/3', 'api/v1/categories', 'api/v1/languages']:
+        first = client.get(endpoint)
+        with count_queries(module_db) as statements:
+            second = client.get(endpoint)
+        assert (second.json == first.json)
+        assert (statements == [])
+
+
+def test_cached_resources_include_caller_votes(
+        module_client, module_db, fake_auth_from_oc):
+    client = module_client
+    apikey = get_api_key(client)
+    id = 8
+
+    client.put(f"/api/v1/resources/{id}/upvote", headers={'x-apikey': apikey})
+
+    # Warm the cache anonymously, then read the same entry with an API key
+    response = client.get(f"api/v1/resources/{id}")
+    assert (response.json['resource']['user_vote_direction'] is None)
+
+    response = client.get(f"api/v1/resources/{id}", headers={'x-apikey': apikey})
+    assert (response.json['resource']['user_vote_direction'] == 'upvote')
+
+    response = client.get('api/v1/resources?page_size=20',
+                          headers={'x-apikey': apikey})
+    directions = {
+        resource['id']: resource['user_vote_direction']
+        for resource in response.json['resources']
+    }
+    assert (directions[id] == 'upvote')
+
+    response = client.get('api/v1/resources?page_size=20')
+    assert all(resource['user_vote_direction'] is None
+               for resource in response.json['resources'])
+
+
+def test_writes_invalidate_cached_responses(
+        module_client, module_db, fake_auth_from_oc, fake_algolia_save):
+    client = module_client
+    apikey = get_api_key(client)
+    id = 1
+
+    clicks = client.get(f"api/v1/resources/{id}").json['resource']['times_clicked']
+    client.put(f"/api/v1/resources/{id}/click")
+    resource = client.get(f"api/v1/resources/{id}").json['resource']
+    assert (resource['times_clicked'] == clicks + 1)
+
+    upvotes = resource['upvotes']
+    client.put(f"/api/v1/resources/{id}/upvote", headers={'x-apikey': apikey})
+    resource = client.get(f"api/v1/resources/{id}").json['resource']
+    assert (resource['upvotes'] == upvotes + 1)
+
+    update_resource(client, apikey, name="Cached name", category="Cached Category")
+    resource = client.get(f"api/v1/resources/{id}").json['resource']
+    assert (resource['name'] == "Cached name")
+    categories = client.get('api/v1/categories').json['categories']
+    assert ("Cached Category" in [category['name'] for category in categories])
+
+    total_count = client.get('api/v1/resources').json['total_count']
+    create_resource(client, apikey)
+    assert (client.get('api/v1/resources').json['total_count'] == total_count + 1)
@@ -1,8 +1,19 @@
-from os import environ
+import threading
+import time
+
+import pytest
+from app.models import IndexOutbox
 from app.utils import random_string
 from .helpers import get_api_key
 
 
+def assert_waiting_in_outbox(resource_id):
+    entry = IndexOutbox.query.filter_by(resource_id=resource_id) \
+        .order_by(IndexOutbox.id.desc()).first()
+    assert (entry.attempts == 1)
+    assert (entry.next_attempt_at is not None)
+
+
 def test_search(
         module_client, module_db, fake_auth_from_oc, fake_algolia_save,
         fake_algolia_search):
@@ -120,8 +131,6 @@ def test_algolia_exception_error(module_client,
                                  module_db,
                                  fake_auth_from_oc,
                                  fake_algolia_exception):
-    # Reset the FLASK_ENV to run Algolia error handling code
-    environ["FLASK_ENV"] = "not_development"
     client = module_client
     first_term = random_string()
     apikey = get_api_key(client)
@@ -144,9 +153,9 @@ def test_algolia_exception_error(module_client,
                            headers={'x-apikey': apikey}
                            )
 
-    assert (response.status_code == 500)
-    assert ("Algolia" in response.get_json().get("errors")[0].get("algolia-failed").get(
-        "message"))
+    # The resource is created, and indexed once Algolia is back
+    assert (response.status_code == 200)
+    assert_waiting_in_outbox(response.json['resources'][0]['id'])
 
     updated_term = random_string()
 
@@ -162,25 +171,27 @@ def test_algolia_exception_error(module_client,
                           headers={'x-apikey': apikey}
                           )
 
-    assert (response.status_code == 500)
-    assert ("Algolia" in response.get_json().get("errors")[0].get("algolia-failed").get(
-        "message"))
-
-    # Set it back to development for other tests
-    environ["FLASK_ENV"] = "development"
+    assert (response.status_code == 200)
+    assert_waiting_in_outbox(1)
 
 
 def test_algolia_unreachable_host_error(module_client,
                                         module_db,
                                         fake_auth_from_oc,
                                         fake_algolia_unreachable_host,):
-    # Reset the FLASK_ENV to run Algolia error handling code
-    environ["FLASK_ENV"] = "not_development"
     client = module_client
     first_term = random_string()
     apikey = get_api_key(client)
 
+    # Searches fall back to the database
+    response = client.get("/api/v1/search?q=python")
+
+    assert (response.status_code == 200)
+    assert (response.json['total_count'] > 0)
+
+    client.application.config['SEARCH_FALLBACK'] = False
     response = client.get("/api/v1/search?q=python")
+    client.application.config['SEARCH_FALLBACK'] = True
 
     assert (response.status_code == 500)
     assert ("Algolia" in response.get_json().get("errors")[0].get("algolia-failed").get(
@@ -195,9 +206,9 @@ def test_algolia_unreachable_host_error(module_client,
                            )],
                            headers={'x-apikey': apikey})
 
-    assert (response.status_code == 500)
-    assert ("Algolia" in response.get_json().get("errors")[0].get("algolia-failed").get(
-        "message"))
+    # The resource is created, and indexed once Algolia is back
+    assert (response.status_code == 200)
+    assert_waiting_in_outbox(response.json['resources'][0]['id'])
 
     updated_term = random_string()
 
@@ -213,9 +224,131 @@ def test_algolia_unreachable_host_error(module_client,
                           headers={'x-apikey': apikey}
                           )
 
-    assert (response.status_code == 500)
-    assert ("Algolia" in response.get_json().get("errors")[0].get("algolia-failed").get(
-        "message"))
+    assert (response.status_code == 200)
+    assert_waiting_in_outbox(1)
+
 
-    # Set it back to development for other tests
-    environ["FLASK_ENV"] = "development"
+def test_database_search(module_client, module_db):
+    client = module_client
+    client.application.config['SEARCH_BACKEND'] = 'database'
+
+    try:
+        result = client.get("/api/v1/search?q=python&page_size=5")
+        assert (result.status_code == 200)
+        assert (0 < len(result.json['resources']) <= 5)
+        assert (result.json['page'] == 0)
+        assert (result.json['records_per_page'] == 5)
+        total_count = result.json['total_count']
+        assert (result.json['number_of_pages'] == -(-total_count // 5))
+        resource = result.json['resources'][0]
+        assert (set(resource) == {
+            'id', 'name', 'url', 'category', 'languages', 'free', 'notes',
+            'upvotes', 'downvotes', 'times_clicked', 'created_at', 'last_updated'})
+
+        # Every word has to match
+        result = client.get(
+            f"/api/v1/search?q=python {random_string()}", follow_redirects=True)
+        assert (result.status_code == 404)
+
+        # Filters
+        result = client.get(
+            "/api/v1/search?q=python&free=false&category=books&page_size=100")
+        assert (result.status_code == 200)
+        assert (all(resource['free'] is False and resource['category'] == 'Books'
+                    for resource in result.json['resources']))
+
+        result = client.get(
+            "/api/v1/search?languages=python&languages=javascript&page_size=100")
+        assert (result.status_code == 200)
+        assert (all({'Python', 'JavaScript'} & set(resource['languages'])
+                    for resource in result.json['resources']))
+
+        result = client.get("/api/v1/search?free=something&page_size=100")
+        assert (result.json['total_count'] == client.get(
+            "/api/v1/resources").json['total_count'])
+
+        # Pages past the last one
+        result = client.get("/api/v1/search?q=python&page=1000", follow_redirects=True)
+        assert (result.status_code == 404)
+    finally:
+        client.application.config['SEARCH_BACKEND'] = 'algolia'
+
+
+@pytest.mark.parametrize('search_backend', ['database', 'memory'])
+def test_search_backend_finds_updates(
+        module_client, module_db, fake_auth_from_oc, fake_algolia_save,
+        search_backend):
+    client = module_client
+    client.application.config['SEARCH_BACKEND'] = search_backend
+    apikey = get_api_key(client)
+    term = random_string()
+
+    try:
+        response = client.post("/api/v1/resources", json=[dict(
+            name=f"Learn {term}", category="Website", url=f"https://{term}.url",
+            languages=["Python"], free=True)], headers={'x-apikey': apikey})
+        assert (response.status_code == 200)
+        resource_id = response.json['resources'][0]['id']
+
+        result = client.get(f"/api/v1/search?q={term}")
+        assert ([resource['id'] for resource in result.json['resources']]
+                == [resource_id])
+
+        # Updated notes and languages are searchable
+        notes_term = random_string()
+        response = client.put(f"/api/v1/resources/{resource_id}", json=dict(
+            notes=f"About {notes_term}", languages=["Haskell"]),
+            headers={'x-apikey': apikey})
+        assert (response.status_code == 200)
+
+        result = client.get(f"/api/v1/search?q={notes_term} haskell")
+        assert ([resource['id'] for resource in result.json['resources']]
+                == [resource_id])
+    finally:
+        client.application.config['SEARCH_BACKEND'] = 'algolia'
+
+
+def test_search_cache(module_client, module_db, fake_auth_from_oc, fake_algolia_save,
+                      mocker):
+    client = module_client
+    config = client.application.config
+    apikey = get_api_key(client)
+    resource_id = client.get("/api/v1/resources").json['resources'][0]['id']
+
+    def algolia_search(term, page_info):
+        hit = client.get(f"/api/v1/resources/{resource_id}").json['resource']
+        hit['notes'] = f"Answer {search.call_count}"
+        return {'hits': [hit], 'page': 0, 'nbPages': 1, 'hitsPerPage': 20, 'nbHits': 1}
+
+    search = mocker.patch('algoliasearch.search_index.SearchIndex.search',
+                          side_effect=algolia_search)
+    config['SEARCH_CACHE_TTL'] = 60
+    term = random_string()
+
+    def notes(url):
+        return client.get(url).json['resources'][0]['notes']
+
+    try:
+        assert notes(f"/api/v1/search?q={term}&languages=a&languages=b") == "Answer 1"
+        # Same search, written differently
+        assert notes(f"/api/v1/search?q=%20{term.upper()}&languages=B&languages=a") \
+            == "Answer 1"
+        assert search.call_count == 1
+
+        # Writes to the index drop the cached answers
+        response = client.put(f"/api/v1/resources/{resource_id}",
+                              json=dict(notes="Updated"), headers={'x-apikey': apikey})
+        assert response.status_code == 200
+        assert notes(f"/api/v1/search?q={term}&languages=a&languages=b") == "Answer 2"
+
+        # Stale answers are returned while searching again in the background
+        mocker.patch('app.search.time.time', return_value=time.time() + 61)
+        assert notes(f"/api/v1/search?q={term}&languages=a&languages=b") == "Answer 2"
+        for thread in threading.enumerate():
+            if thread.name == 'search-refresh':
+                thread.join()
+        assert search.call_count == 3
+        assert notes(f"/api/v1/search?q={term}&languages=a&languages=b") == "Answer 3"
+        assert search.call_count == 3
+    finally:
+        config['SEARCH_CACHE_TTL'] = 0
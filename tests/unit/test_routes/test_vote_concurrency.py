@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import app
+from app import db as _db
+from app.cache import invalidate_catalog
+from app.models import Key, Resource
+from app.utils import random_string
+
+
+@pytest.fixture(scope='function')
+def file_db(tmp_path):
+    """
+    Database in a file, since every thread needs its own connection to vote
+    in parallel, which an in-memory database doesn't allow
+    """
+    database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'votes.db'}"
+    with app.app_context():
+        _db.create_all()
+        from app.cli import import_resources
+        import_resources(_db)
+        invalidate_catalog()
+
+    yield _db
+
+    with app.app_context():
+        _db.drop_all()
+        _db.session.remove()
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+
+
+def create_api_keys(count):
+    with app.app_context():
+        keys = [Key(apikey=random_string(), email=f"{random_string()}@example.org")
+                for _ in range(count)]
+        _db.session.add_all(keys)
+        _db.session.commit()
+        return [key.apikey for key in keys]
+
+
+def vote(apikey, direction, id=1):
+    with app.test_client() as client:
+        response = client.put(f"/api/v1/resources/{id}/{direction}",
+                              headers={'x-apikey': apikey})
+        assert (response.status_code == 200)
+
+
+def get_counts(id=1):
+    with app.app_context():
+        resource = Resource.query.get(id)
+        return resource.upvotes, resource.downvotes
+
+
+def test_parallel_votes(file_db):
+    voters = create_api_keys(20)
+    initial_upvotes, initial_downvotes = get_counts()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(vote, voters, ['upvote'] * len(voters)))
+    assert (get_counts() == (initial_upvotes + 20, initial_downvotes))
+
+    # Half of the voters change their mind
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(vote, voters[:10], ['downvote'] * 10))
+    assert (get_counts() == (initial_upvotes + 10, initial_downvotes + 10))
+
+
+def test_parallel_votes_same_voter(file_db):
+    apikey, = create_api_keys(1)
+    initial_counts = get_counts()
+
+    # Each vote withdraws the previous one, so an even number cancels out
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(vote, [apikey] * 10, ['upvote'] * 10))
+    assert (get_counts() == initial_counts)
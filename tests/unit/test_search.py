@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app import db
+from app.cache import Cache, SharedMemoryCache, invalidate_catalog, search_cache
+from app.models import IndexSyncState, Resource
+from app.search import (
+    InMemoryBackend, rebuild_index, search_backends, sync_index, sync_memory_index)
+
+
+def resource(id, name, category='Books', languages=(), free=True, notes=''):
+    return dict(objectID=id, id=id, name=name, category=category,
+                languages=list(languages), free=free, notes=notes)
+
+
+def hit_ids(answer):
+    return [hit['id'] for hit in answer['hits']]
+
+
+def test_in_memory_search():
+    backend = InMemoryBackend()
+    backend.replace_all_objects([
+        resource(1, 'Automate the Boring Stuff', languages=['Python'], notes='Scripts'),
+        resource(2, 'Eloquent JavaScript', languages=['JavaScript']),
+        resource(3, 'Python Tutorial', category='Website', languages=['Python'],
+                 free=False),
+        resource(4, 'Learn You a Haskell', languages=['Haskell'],
+                 notes='Python programmers welcome'),
+    ])
+
+    # Matches in the name rank first
+    assert (hit_ids(backend.search('python')) == [3, 1, 4])
+    # Every word has to match, the last one as a prefix
+    assert (hit_ids(backend.search('boring scr')) == [1])
+    assert (hit_ids(backend.search('bor scripts')) == [])
+    assert (hit_ids(backend.search('')) == [1, 2, 3, 4])
+
+    # Filters
+    assert (hit_ids(backend.search('python', free=False)) == [3])
+    assert (hit_ids(backend.search('python', category='books')) == [1, 4])
+    assert (hit_ids(backend.search('', languages=['javascript', 'Haskell'])) == [2, 4])
+
+    # Pages
+    answer = backend.search('', page=1, page_size=3)
+    assert (hit_ids(answer) == [4])
+    assert (answer['page'], answer['nbPages'], answer['hitsPerPage'],
+            answer['nbHits']) == (1, 2, 3, 4)
+    assert (hit_ids(backend.search('', page=2, page_size=3)) == [])
+
+
+def test_in_memory_writes():
+    backend = InMemoryBackend()
+    backend.save_objects(
+        [resource(1, 'Eloquent JavaScript', languages=['JavaScript'])])
+
+    backend.partial_update_object(
+        {'objectID': 1, 'name': 'Learning TypeScript', 'languages': ['TypeScript']})
+    assert (hit_ids(backend.search('eloquent')) == [])
+    assert (hit_ids(backend.search('learning')) == [1])
+    assert (hit_ids(backend.search('', languages=['javascript'])) == [])
+    hit, = backend.search('', languages=['typescript'])['hits']
+    assert (hit['category'] == 'Books')
+
+    backend.save_objects([resource(1, 'Exploring ES6'), resource(2, 'Exploring JS')])
+    assert (hit_ids(backend.search('exploring')) == [1, 2])
+
+    backend.replace_all_objects([resource(3, 'Exploring Rust')])
+    assert (hit_ids(backend.search('exploring')) == [3])
+
+
+def test_in_memory_syncs_on_new_version():
+    resources = [resource(1, 'Eloquent JavaScript')]
+    version = [0]
+
+    def sync(backend, since):
+        backend.save_objects(resources[since or 0:])
+        return len(resources)
+
+    backend = InMemoryBackend(sync=sync, version=lambda: version[0])
+
+    assert (hit_ids(backend.search('')) == [1])
+
+    resources.append(resource(2, 'Python Tutorial'))
+    assert (hit_ids(backend.search('')) == [1])
+
+    version[0] += 1
+    assert (hit_ids(backend.search('')) == [1, 2])
+
+
+def test_in_memory_syncs_after_index_writes(module_client, module_db):
+    backend = search_backends['memory']
+    backend.search('')
+
+    try:
+        with patch.object(backend, 'sync', wraps=sync_memory_index) as sync:
+            # Votes and clicks don't change what is indexed
+            invalidate_catalog()
+            backend.search('')
+            assert (not sync.called)
+
+            # Only the resources changed since the previous sync are read
+            search_cache.clear()
+            backend.search('')
+            assert (sync.call_count == 1)
+            assert (sync.call_args[0][1] is not None)
+    finally:
+        search_cache.clear()
+
+
+def test_sync_index(module_client, module_db):
+    backend = InMemoryBackend()
+    backend.save_objects([resource(999999, 'Deleted')])
+    total = Resource.query.count()
+
+    # The first sync writes everything
+    assert (sync_index(backend, batch_size=7, name='test') == (total, 1))
+    assert (len(backend.object_ids()) == total)
+    assert (IndexSyncState.query.get('test').synced_at is not None)
+
+    # Later ones only what changed since
+    since = datetime(2100, 1, 1, tzinfo=timezone.utc)
+    assert (sync_index(backend, since=since, name='test') == (0, 0))
+
+    changed = Resource.query.order_by(Resource.id.desc()).first()
+    Resource.query.filter_by(id=changed.id).update(
+        {'last_updated': datetime(2200, 1, 1), 'notes': 'Synced'},
+        synchronize_session=False)
+    db.session.commit()
+    assert (sync_index(backend, since=since, name='test') == (1, 0))
+    assert (backend.search('synced')['hits'][0]['id'] == changed.id)
+
+
+def test_rebuild_index(module_client, module_db):
+    backend = InMemoryBackend()
+    backend.save_objects([resource(999999, 'Deleted')])
+    total = Resource.query.count()
+    progress = []
+
+    rebuild_index(backend, batch_size=10,
+                  progress=lambda done, total: progress.append((done, total)))
+
+    assert (sorted(backend.object_ids()) == [
+        id for id, in db.session.query(Resource.id).order_by(Resource.id)])
+    assert (progress[0] == (10, total))
+    assert (progress[-1] == (total, total))
+    assert (len(progress) == -(-total // 10))
+
+
+def test_rebuild_index_clears_workers_cache(module_client, module_db, tmp_path):
+    path = str(tmp_path / 'cache')
+    worker_cache = Cache('search', backend=SharedMemoryCache(
+        path, slots=16, slot_size=1024))
+    worker_cache.set('answer', 'before the reindex')
+
+    # The CLI, which keeps its own cache in memory, reindexes
+    with patch('app.cache.Config.CACHE_PATH', path):
+        rebuild_index(InMemoryBackend())
+
+    assert (worker_cache.get('answer') is None)